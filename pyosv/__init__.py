@@ -2,10 +2,19 @@
    .. include:: ../README.md
 """
 
-from .ai import *
-from .freq import *
-from .io import *
-from .plot import *
-from .post import *
-from .pre import *
-from .utils import *
\ No newline at end of file
+from ._lazy import attach
+
+# Subpackages only define lazy lookup tables, importing them is cheap: their modules and
+# the heavy third-party libraries they need are imported on first attribute access
+from . import ai, freq, io, pipeline, plot, post, pre, utils
+
+_SUBPACKAGES = {'ai' : ai, 'freq' : freq, 'io' : io, 'pipeline' : pipeline, 'plot' : plot, 'post' : post, 'pre' : pre, 'utils' : utils}
+
+# Later subpackages take precedence, as with star imports
+__getattr__, __dir__, __all__ = attach(__name__,
+    submodules = list(_SUBPACKAGES),
+    names      = {name : '.' + package for package in _SUBPACKAGES
+                  for name in _SUBPACKAGES[package].__all__ if name not in _SUBPACKAGES})
+
+# As with star imports, pyosv.plot is the plot function, not the subpackage (as in pyosv.plot itself)
+plot = plot.plot
\ No newline at end of file
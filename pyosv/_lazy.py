@@ -0,0 +1,96 @@
+'''
+    Helpers to resolve pyosv submodules and heavy third-party modules lazily
+'''
+
+import importlib
+import types
+import sys
+
+
+def attach(package_name : str, submodules : list, names : dict) -> tuple:
+    '''
+        Build the module-level __getattr__, __dir__ and __all__ of a package whose
+        submodules and public names are imported on first attribute access (PEP 562)
+
+        Parameters:
+        -----------
+            - package_name : str
+                name of the package (__name__)
+            - submodules : list
+                list of submodules that can be accessed as attributes of the package
+            - names : dict
+                dictionary mapping each public name to the (relative) module defining it,
+                names take precedence over submodules with the same name
+
+        Returns:
+        --------
+            - (__getattr__, __dir__, __all__) : tuple
+                functions and list to be assigned in the package namespace
+
+        Usage:
+        ------
+        ```python
+        __getattr__, __dir__, __all__ = attach(__name__,
+            submodules = ['reader'],
+            names      = {'load' : '.reader'})
+        ```
+    '''
+
+    submodules = set(submodules)
+    names = dict(names)
+    __all__ = sorted(submodules | set(names))
+
+    def __getattr__(name : str):
+        if name in names:
+            value = getattr(importlib.import_module(names[name], package_name), name)
+            # Cache the resolved value, __getattr__ is only called for missing attributes
+            setattr(sys.modules[package_name], name, value)
+            return value
+
+        if name in submodules:
+            return importlib.import_module('.' + name, package_name)
+
+        raise AttributeError('module {!r} has no attribute {!r}'.format(package_name, name))
+
+    def __dir__() -> list:
+        return list(__all__)
+
+    return __getattr__, __dir__, __all__
+
+
+class _LazyModule(types.ModuleType):
+    '''
+        Module placeholder importing the real module on first attribute access
+    '''
+
+    def __getattr__(self, attr : str):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name : str) -> types.ModuleType:
+    '''
+        Return a module that is imported only when one of its attributes is accessed
+
+        Parameters:
+        -----------
+            - name : str
+                absolute name of the module (e.g. 'matplotlib.pyplot')
+
+        Returns:
+        --------
+            - module : types.ModuleType
+                the module if it is already imported, otherwise a lazy placeholder
+
+        Usage:
+        ------
+        ```python
+        plt = lazy_import('matplotlib.pyplot')
+        plt.imread('path/to/image.png')   # matplotlib is imported here
+        ```
+    '''
+
+    if name in sys.modules:
+        return sys.modules[name]
+    return _LazyModule(name)
@@ -2,5 +2,13 @@
     pyosv routines related to ai-based image processing
 '''
 
-from .clustering import *
-from .data_reduction import *
\ No newline at end of file
+from .._lazy import attach
+
+__getattr__, __dir__, __all__ = attach(__name__,
+    submodules = ['clustering', 'data_reduction'],
+    names      = {
+        'pixel_clustering' : '.clustering',
+        'conv_clustering'  : '.clustering',
+        'image_PCA'        : '.data_reduction',
+        'image_stack_PCA'  : '.data_reduction',
+    })
\ No newline at end of file
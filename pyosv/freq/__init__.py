@@ -2,5 +2,15 @@
     pyosv routines related to image frequency analysis
 '''
 
-from .fft import *
-from .filters import *
\ No newline at end of file
+from .._lazy import attach
+
+__getattr__, __dir__, __all__ = attach(__name__,
+    submodules = ['fft', 'filters'],
+    names      = {
+        'fft2d'           : '.fft',
+        'ifft2d'          : '.fft',
+        'fft3d'           : '.fft',
+        'ifft3d'          : '.fft',
+        'gaussian_filter' : '.filters',
+        'lhp_filter'      : '.filters',
+    })
\ No newline at end of file
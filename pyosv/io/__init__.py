@@ -2,6 +2,35 @@
     pyosv routines related to image input/output
 '''
 
-from .batch_reader import *
-from .reader import *
-from .writer import *
\ No newline at end of file
+from .._lazy import attach
+
+__getattr__, __dir__, __all__ = attach(__name__,
+    submodules = ['async_reader', 'background_writer', 'batch_reader', 'catalog', 'chunk_store', 'mosaic', 'netcdf_reader', 'netcdf_writer', 'parallel_reader', 'parallel_writer', 'patch_dataset', 'raster', 'raster_writer', 'reader', 'tile_cache', 'writer'],
+    names      = {
+        'AsyncReader'           : '.async_reader',
+        'load_async'            : '.async_reader',
+        'BackgroundWriter'      : '.background_writer',
+        'load_batches'          : '.batch_reader',
+        'load_prefetch'         : '.batch_reader',
+        'Catalog'               : '.catalog',
+        'CATALOG_EXTENSIONS'    : '.catalog',
+        'ChunkStore'            : '.chunk_store',
+        'CHUNK_STORE_EXTENSION' : '.chunk_store',
+        'CHUNK_STORE_METADATA'  : '.chunk_store',
+        'CHUNK_COMPRESSIONS'    : '.chunk_store',
+        'Mosaic'                : '.mosaic',
+        'load_netcdf'           : '.netcdf_reader',
+        'iter_netcdf'           : '.netcdf_reader',
+        'TIME_DIMENSIONS'       : '.netcdf_reader',
+        'write_netcdf'          : '.netcdf_writer',
+        'load_many'             : '.parallel_reader',
+        'write_many'            : '.parallel_writer',
+        'PatchDataset'          : '.patch_dataset',
+        'Raster'                : '.raster',
+        'RasterWriter'          : '.raster_writer',
+        'load'                  : '.reader',
+        'TileCache'             : '.tile_cache',
+        'get_tile_cache'        : '.tile_cache',
+        'set_tile_cache'        : '.tile_cache',
+        'write'                 : '.writer',
+    })
\ No newline at end of file
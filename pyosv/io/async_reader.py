@@ -0,0 +1,247 @@
+from . import batch_reader
+from .reader import load
+from .raster import Raster
+
+from concurrent.futures import ThreadPoolExecutor
+from rasterio.windows import Window
+import numpy as np
+import functools
+import asyncio
+
+
+class AsyncReader:
+    '''
+        Asyncio interface to the pyosv readers.
+
+        Reads run on a thread pool (rasterio releases the GIL while reading and decoding), so awaiting
+        them never blocks the event loop. At most max_concurrency reads run at once, the others wait
+        on a semaphore without holding a thread.
+
+        Cancelling a task awaiting a read returns immediately; a read that was not started yet is
+        dropped, a read already running in a thread (GDAL reads can not be interrupted) completes
+        in background and its result is discarded, its concurrency slot is released only then.
+
+        Parameters:
+        -----------
+            - max_concurrency : int
+                maximum number of reads running at the same time (default : 8)
+            - executor : concurrent.futures.Executor
+                executor running the reads, if None a thread pool of max_concurrency threads is
+                created and shut down by close (default : None)
+
+        Usage:
+        ------
+        ```python
+        async with AsyncReader(max_concurrency=16) as reader:
+            img, meta, bounds = await reader.load('path/to/image.tif', bands=[3, 2, 1])
+            tile = await reader.read('path/to/image.tif', window=Window(0, 0, 256, 256))
+
+            async for patch in reader.patches('path/to/image.tif', patch_shape=(256, 256)):
+                await queue.put(patch)
+        ```
+    '''
+
+    def __init__(self, max_concurrency : int = 8, executor = None) -> None:
+        if max_concurrency < 1:
+            raise Exception('Error: max_concurrency must be grather than 0')
+
+        self.max_concurrency = max_concurrency
+        self._own_executor = executor is None
+        self._executor = executor if executor is not None else ThreadPoolExecutor(max_workers=max_concurrency)
+        self._semaphore = None
+        self._futures = set()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        '''
+            Shut down the thread pool created by the reader (running reads are completed)
+        '''
+        if self._own_executor:
+            # Executor.shutdown(cancel_futures=True) needs Python 3.9
+            for future in list(self._futures):
+                future.cancel()
+            self._executor.shutdown(wait=False)
+
+    async def run(self, func, *args, **kwargs):
+        '''
+            Run func(*args, **kwargs) on the executor, within the concurrency limit
+
+            Usage:
+            ------
+            ```python
+            data = await reader.run(np.load, 'path/to/file.npy')
+            ```
+        '''
+        return await asyncio.wrap_future(await self._submit(self._executor, func, *args, **kwargs))
+
+    async def load(self, path : str, **kwargs):
+        '''
+            Awaitable pyosv.io.reader.load
+
+            Parameters:
+            -----------
+                - path : str
+                    position of the image
+                - kwargs : dict
+                    further arguments passed to pyosv.io.reader.load (e.g. bands, resolution, dtype)
+
+            Returns:
+            --------
+                - (data, metadata, bounds) : tuple
+                    the output of pyosv.io.reader.load
+
+            Usage:
+            ------
+            ```python
+            results = await asyncio.gather(*[reader.load(p, resolution=60) for p in paths])
+            ```
+        '''
+        return await self.run(load, path, **kwargs)
+
+    async def read(self, path : str, window : Window = None, **kwargs) -> np.ndarray:
+        '''
+            Awaitable windowed read, see pyosv.io.raster.Raster.read
+
+            Parameters:
+            -----------
+                - path : str
+                    position of the raster
+                - window : rasterio.windows.Window
+                    window to be read, if None the full raster is read (default : None)
+                - kwargs : dict
+                    further arguments passed to pyosv.io.raster.Raster.read (e.g. bands, resolution, dtype)
+
+            Returns:
+            --------
+                - data : np.ndarray
+                    HxWxB data, with H height, W width and B bands
+
+            Usage:
+            ------
+            ```python
+            tile = await reader.read('path/to/image.tif', window=Window(512, 512, 256, 256), bands=[3, 2, 1])
+            ```
+        '''
+        return await self.run(_read_window, path, window, kwargs)
+
+    async def patches(self, path : str, patch_shape : tuple = (64,64), batch_size : int = None, **kwargs):
+        '''
+            Asynchronous iterator over the patches (or mini-batches) of an image
+
+            The patches of pyosv.io.batch_reader.load (pyosv.io.batch_reader.load_batches if batch_size
+            is given) are produced one at a time on a thread of their own, the next one is read only when the
+            iterator is advanced, so the buffer reuse rules of the synchronous readers still hold.
+            Breaking out of the loop, or cancelling the consuming task, closes the image.
+
+            Parameters:
+            -----------
+                - path : str
+                    position of the image
+                - patch_shape : tuple[int,int]
+                    tuple of two integers representing the size of the patches (default : (64, 64))
+                - batch_size : int
+                    if given, yield batches of batch_size patches (default : None)
+                - kwargs : dict
+                    further arguments passed to the patch reader (e.g. stride, padding, dtype, return_window)
+
+            Returns:
+            --------
+                - data : np.ndarray
+                    patch (or batch), as returned by the synchronous reader
+
+            Usage:
+            ------
+            ```python
+            async for patch, window, transform in reader.patches('path/to/image.tif', (256, 256), return_window=True):
+                await send(patch, window)
+            ```
+        '''
+        if batch_size is None:
+            iterator = batch_reader.load(path, patch_shape, **kwargs)
+        else:
+            iterator = batch_reader.load_batches(path, patch_shape, batch_size=batch_size, **kwargs)
+
+        # rasterio environments are per thread: the generator is advanced and closed on a single thread,
+        # a pending step (e.g. after a cancellation) is completed before the image is closed
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            while True:
+                item = await asyncio.wrap_future(await self._submit(executor, next, iterator, _DONE))
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            executor.submit(iterator.close)
+            executor.shutdown(wait=False)
+
+    async def _submit(self, executor, func, *args, **kwargs):
+        '''
+            Wait for a concurrency slot and submit func to executor, return the concurrent future
+        '''
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        await self._semaphore.acquire()
+        try:
+            future = executor.submit(functools.partial(func, *args, **kwargs))
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+        # The slot is released when the thread is done, not when the awaiting task is cancelled
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        future.add_done_callback(lambda _: _release(loop, self._semaphore))
+        return future
+
+
+_DONE = object()
+
+
+def _release(loop : asyncio.AbstractEventLoop, semaphore : asyncio.Semaphore) -> None:
+    '''
+        Release a slot from the worker thread; reads completing after the loop closed have no slot to release
+    '''
+    if not loop.is_closed():
+        try:
+            loop.call_soon_threadsafe(semaphore.release)
+        except RuntimeError:
+            # Closed between the check and the call
+            pass
+
+
+async def load_async(path : str, **kwargs):
+    '''
+        Awaitable pyosv.io.reader.load, run on the default executor of the event loop
+
+        Parameters:
+        -----------
+            - path : str
+                position of the image
+            - kwargs : dict
+                further arguments passed to pyosv.io.reader.load
+
+        Returns:
+        --------
+            - (data, metadata, bounds) : tuple
+                the output of pyosv.io.reader.load
+
+        Usage:
+        ------
+        ```python
+        img, meta, bounds = await load_async('path/to/image.tif', resolution=60)
+        ```
+    '''
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(load, path, **kwargs))
+
+
+def _read_window(path : str, window : Window, kwargs : dict) -> np.ndarray:
+    with Raster(path) as raster:
+        return raster.read(window=window, **kwargs)
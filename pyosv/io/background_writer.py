@@ -0,0 +1,189 @@
+from .writer import write
+
+import numpy as np
+import threading
+import shutil
+import queue
+import os
+
+
+class BackgroundWriter:
+    '''
+        Write-behind queue of images, saved by pyosv.io.writer.write on a background thread.
+
+        write only puts the image in a bounded queue and returns, so the compute thread goes on with
+        the next image while the previous ones are compressed and written; when max_queue images are
+        waiting, write blocks until one has been saved, so memory stays bounded.
+
+        Each image is written to a temporary file next to its destination (same extension, so the
+        format is the same) and atomically renamed on completion: a destination path is either missing,
+        or holds the previous version, or the complete new image, never a partial one, even if the
+        process is killed while writing.
+
+        An error in the background thread does not stop the queue (the temporary file is removed and
+        the next images are written); the first error is raised by the next call to write, flush or
+        close.
+
+        Parameters:
+        -----------
+            - max_queue : int
+                maximum number of images waiting to be written (default : 8)
+            - num_threads : int or str
+                GDAL compression threads of each write, or 'ALL_CPUS' (default : 'ALL_CPUS')
+            - kwargs : dict
+                default arguments of pyosv.io.writer.write (e.g. cog, dtype, scale, compress)
+
+        Attributes:
+        -----------
+            - written : list
+                positions of the images written so far, in completion order
+
+        Usage:
+        ------
+        ```python
+        with BackgroundWriter(max_queue=4, cog=True) as writer:
+            for img, meta, path in inputs:
+                writer.write(predict(img), path.replace('.tif', '_pred.tif'), meta)
+        ```
+    '''
+
+    def __init__(self, max_queue : int = 8, num_threads : int or str = 'ALL_CPUS', **kwargs) -> None:
+        if max_queue < 1:
+            raise Exception('Error: max_queue must be grather than 0')
+
+        self.max_queue = max_queue
+        self.kwargs = dict(kwargs, num_threads=num_threads)
+        self.written = []
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._errors = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='pyosv-background-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        '''
+            True if the writer has been closed
+        '''
+        return self._closed
+
+    @property
+    def pending(self) -> int:
+        '''
+            Number of images queued or being written
+        '''
+        return self._queue.unfinished_tasks
+
+    def write(self, image : np.ndarray, path : str, meta : dict = None, copy : bool = True, **kwargs) -> None:
+        '''
+            Queue an image to be saved, blocking while max_queue images are waiting
+
+            Parameters:
+            -----------
+                - image : np.ndarray
+                    the HxWxB image to be saved (channel last)
+                - path : str
+                    position of the image
+                - meta : dict
+                    metadata of the image, as for pyosv.io.writer.write (default : None)
+                - copy : bool
+                    if True the image is copied, so its buffer can be reused at once; use False only if
+                    the image is not modified until it has been written (default : True)
+                - kwargs : dict
+                    arguments of pyosv.io.writer.write overriding the ones of the writer
+
+            Usage:
+            ------
+            ```python
+            writer.write(pred, 'path/to/pred.tif', meta, dtype='uint8')
+            ```
+        '''
+        if self._closed:
+            raise Exception('Error: the background writer has been closed')
+        self._raise()
+
+        image = np.array(image, copy=True) if copy else image
+        meta = dict(meta) if meta is not None else None
+        self._queue.put((image, path, meta, dict(self.kwargs, **kwargs)))
+
+    def flush(self) -> None:
+        '''
+            Wait until all the queued images have been written, raise the first error of the background thread
+        '''
+        self._queue.join()
+        self._raise()
+
+    def close(self) -> None:
+        '''
+            Write the queued images, stop the background thread and raise the first error, if any
+        '''
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+        self._raise()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            # Do not hide the exception of the with block
+            try:
+                self.close()
+            except Exception:
+                pass
+
+    def __repr__(self) -> str:
+        return '<BackgroundWriter pending={} written={}>'.format(self.pending, len(self.written))
+
+    def _raise(self) -> None:
+        with self._lock:
+            if len(self._errors) > 0:
+                error = self._errors.pop(0)
+                self._errors.clear()
+                raise error
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                image, path, meta, kwargs = item
+                _write_atomic(image, path, meta, kwargs)
+                with self._lock:
+                    self.written.append(path)
+            except Exception as error:
+                with self._lock:
+                    self._errors.append(error)
+            finally:
+                self._queue.task_done()
+
+
+def _write_atomic(image : np.ndarray, path : str, meta : dict, kwargs : dict) -> None:
+    '''
+        pyosv.io.writer.write to a temporary path with the same extension, then rename it to path
+    '''
+    root, extension = os.path.splitext(path)
+    tmp = '{}.{}.{}.tmp{}'.format(root, os.getpid(), threading.get_ident(), extension)
+
+    try:
+        write(image, tmp, meta, **kwargs)
+        if os.path.isdir(tmp) and os.path.isdir(path):
+            # Directories (chunk stores) can not replace a non-empty directory: swap them
+            old = '{}.{}.old'.format(tmp, os.getpid())
+            os.replace(path, old)
+            os.replace(tmp, path)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.replace(tmp, path)
+    except BaseException:
+        if os.path.isdir(tmp):
+            shutil.rmtree(tmp, ignore_errors=True)
+        elif os.path.exists(tmp):
+            os.remove(tmp)
+        raise
@@ -1,22 +1,53 @@
 from ..utils.paths import get_path_gui
+from .raster import _read_into
+from .mosaic import _nodata_only
 
+from concurrent.futures import ThreadPoolExecutor
+from rasterio.enums import MaskFlags
 from rasterio.windows import Window
+from rasterio import windows
+from collections import deque
 import numpy as np
+import threading
 import rasterio
 
 
-def load(path : str, patch_shape : tuple = (64,64)) -> np.ndarray:
+def load(path : str, patch_shape : tuple = (64,64), out : np.ndarray = None, dtype : str = None, stride : tuple = None,
+         padding : str = None, fill_value : float = None, return_window : bool = False, min_valid : float = None) -> np.ndarray:
     '''
         Load an image patch by patch
 
         Supported data format
 
         RASTERIO_EXTENSIONS   = ['.tif', '.tiff', '.geotiff']  
-        MATPLOTLIB_EXTENSIONS = ['.png', '.jpg', 'jpeg']
+        MATPLOTLIB_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.jp2']
 
         Returns always data in channel last format.
 
-        If image extension is in MATPLOTLIB_EXTENSIONS, metadata and bound will be None.
+        Images of MATPLOTLIB_EXTENSIONS are decoded by GDAL (rasterio) in their native dtype (e.g. uint8 or
+        uint16), strip by strip like the other formats (PNG and JPEG line by line, JP2 tile by tile), so
+        the full image is never decoded at once.
+
+        The image is opened once and read in strips aligned to its internal blocks (blockysize rows, full
+        width), consecutive strips share their overlapping blocks, so each block is decoded only once.
+
+        Patches are read directly into C-contiguous channel-last buffers. If out is given, every patch
+        is read into out and out itself is yielded: its content is overwritten when the next patch is read.
+
+        Patches are taken every stride pixels (overlapping if stride < patch_shape). If padding is None only
+        patches fully inside the image are returned, otherwise the grid covers the whole image and the
+        patches crossing the right/bottom edges are padded with the given numpy.pad mode ('constant' uses
+        fill_value, 'reflect', 'symmetric', 'edge', ...). With return_window each patch is returned together
+        with its window and affine transform, to write results back in place.
+
+        If min_valid is given, patches whose fraction of valid pixels is below it are skipped. When the
+        dataset has overviews, or an alpha band or internal mask, the fraction is estimated before reading
+        on a low-resolution copy of the dataset mask read once (from the mask overviews, or from the mask
+        only), and rows of patches without any valid patch are not read at all. Without overviews a
+        nodata mask can only be computed by decoding every block of every band, which costs more than
+        the read it would save: the fraction is then computed exactly on the pixels of each patch (a
+        pixel is not valid if all its bands are nodata) and patches are read before being skipped.
+        Pixels outside of the image (padding) count as not valid.
         
         Parameters:
         -----------
@@ -24,11 +55,29 @@ def load(path : str, patch_shape : tuple = (64,64)) -> np.ndarray:
                 position of the image, if None the function will ask for the image path using a menu
             - patch_shape :  tuple[int,int]
                 tuple of two integers representing the size of the patches to be loaded from the image
+            - out : np.ndarray
+                preallocated C-contiguous patch_shape[0]xpatch_shape[1]xB buffer reused for every patch (default : None)
+            - dtype : str
+                dtype of the patches when out is None, if None the image dtype is used (default : None)
+            - stride : tuple[int,int]
+                tuple of two integers representing the step between patches, if None it is patch_shape (default : None)
+            - padding : str
+                numpy.pad mode used for the patches crossing the image edges, if None they are skipped (default : None)
+            - fill_value : float
+                value used by the 'constant' padding, if None the image nodata or 0 (default : None)
+            - return_window : bool
+                if True yield (data, window, transform) instead of data (default : False)
+            - min_valid : float
+                minimum fraction (0-1) of valid pixels of the patches, if None all the patches are returned (default : None)
 
         Returns:
         --------
             - data : np.ndarray
                 patch_shape[0]xpatch_shape[1]xB image patch, with patch_shape[0] width, patch_shape[1] height and B bands
+            - window : rasterio.windows.Window
+                window of the patch in the image (may extend beyond the image if padding is used), only if return_window
+            - transform : Affine
+                affine transform of the patch, only if return_window
         
         Usage:
         ------
@@ -89,22 +138,449 @@ def load(path : str, patch_shape : tuple = (64,64)) -> np.ndarray:
         ```
     '''
 
-    RASTERIO_EXTENSIONS = ['.tif', '.tiff']
+    RASTERIO_EXTENSIONS   = ['.tif', '.tiff']
+    MATPLOTLIB_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.jp2']
 
     if path is None:
         path = get_path_gui()
 
-    if any(frmt in path for frmt in RASTERIO_EXTENSIONS):
+    if any(frmt in path for frmt in RASTERIO_EXTENSIONS + MATPLOTLIB_EXTENSIONS):
+
+        if out is not None and out.shape[:2] != tuple(patch_shape):
+            raise Exception('Error: out must have shape (patch_shape[0], patch_shape[1], B)')
 
         with rasterio.open(path) as src:
-            c, w, h = src.read().shape
+            fill_value = _fill_value(src, fill_value)
 
-        for i in range(0, w - patch_shape[0], patch_shape[0]):
-            for j in range(0, h -  patch_shape[1], patch_shape[1]):
+            for block, window in _iter_blocks(src, patch_shape, stride, padding, min_valid):
+                if out is None:
+                    data = np.empty((patch_shape[0], patch_shape[1], src.count), dtype=dtype if dtype is not None else src.dtypes[0])
+                else:
+                    data = out
+                _fill_patch(data, block, padding, fill_value)
 
-                with rasterio.open(path) as src:
-                    data = src.read(window=Window(j, i, patch_shape[1], patch_shape[0]))
-                    data = np.moveaxis(data, 0, -1)
-                yield data
+                if return_window:
+                    yield data, window, windows.transform(window, src.transform)
+                else:
+                    yield data
     else:
-        raise Exception('Error: file can not be opened or format not supported!')
\ No newline at end of file
+        raise Exception('Error: file can not be opened or format not supported!')
+
+
+
+
+def load_batches(path : str, patch_shape : tuple = (64,64), batch_size : int = 32, buffers : int = 2, dtype : str = None,
+                 stride : tuple = None, padding : str = None, fill_value : float = None, return_window : bool = False,
+                 min_valid : float = None) -> np.ndarray:
+    '''
+        Load an image in mini-batches of patches, written into a small pool of recycled buffers
+
+        Same patches, in the same order, as load, stacked in NxHxWxB batches. Batches are written into
+        buffers preallocated once and reused in turn, so no memory is allocated per batch.
+
+        Buffer reuse guarantee: the batch yielded at step n is overwritten only while the generator
+        produces the batch of step n + buffers. The last buffers - 1 batches thus stay valid while the next
+        one is being filled (e.g. with buffers=2 the previous batch can still be copied to a device while
+        the current one is processed); copy a batch to keep it longer. The last batch may have less than
+        batch_size patches. Patches with less than min_valid valid pixels are skipped as in load.
+
+        Supported data format
+
+        RASTERIO_EXTENSIONS   = ['.tif', '.tiff']
+        MATPLOTLIB_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.jp2']
+
+        Parameters:
+        -----------
+            - path : str
+                position of the image, if None the function will ask for the image path using a menu
+            - patch_shape :  tuple[int,int]
+                tuple of two integers representing the size of the patches to be loaded from the image
+            - batch_size : int
+                number of patches per batch (default : 32)
+            - buffers : int
+                number of batch buffers recycled in turn (default : 2)
+            - dtype : str
+                dtype of the batches, if None the image dtype is used (default : None)
+            - stride : tuple[int,int]
+                tuple of two integers representing the step between patches, if None it is patch_shape (default : None)
+            - padding : str
+                numpy.pad mode used for the patches crossing the image edges, if None they are skipped (default : None)
+            - fill_value : float
+                value used by the 'constant' padding, if None the image nodata or 0 (default : None)
+            - return_window : bool
+                if True yield (batch, windows, transforms) instead of batch (default : False)
+            - min_valid : float
+                minimum fraction (0-1) of valid pixels of the patches, if None all the patches are returned (default : None)
+
+        Returns:
+        --------
+            - batch : np.ndarray
+                Nxpatch_shape[0]xpatch_shape[1]xB batch of patches, with N <= batch_size and B bands
+            - windows : list
+                windows of the patches in the batch, only if return_window
+            - transforms : list
+                affine transforms of the patches in the batch, only if return_window
+
+        Usage:
+        ------
+        ```python
+        for batch in load_batches('path/to/image.tif', patch_shape=(256, 256), batch_size=16, dtype='float32'):
+            predictions = model(batch)
+        ```
+    '''
+
+    RASTERIO_EXTENSIONS   = ['.tif', '.tiff']
+    MATPLOTLIB_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.jp2']
+
+    if path is None:
+        path = get_path_gui()
+
+    if not any(frmt in path for frmt in RASTERIO_EXTENSIONS + MATPLOTLIB_EXTENSIONS):
+        raise Exception('Error: file can not be opened or format not supported!')
+    if batch_size < 1 or buffers < 1:
+        raise Exception('Error: batch_size and buffers must be grather than 0')
+
+    with rasterio.open(path) as src:
+        fill_value = _fill_value(src, fill_value)
+        pool = [np.empty((batch_size, patch_shape[0], patch_shape[1], src.count), dtype=dtype if dtype is not None else src.dtypes[0])
+                for _ in range(buffers)]
+
+        n, k, batch_windows = 0, 0, []
+        for block, window in _iter_blocks(src, patch_shape, stride, padding, min_valid):
+            _fill_patch(pool[n % buffers][k], block, padding, fill_value)
+            batch_windows.append(window)
+            k += 1
+
+            if k == batch_size:
+                yield _batch(pool[n % buffers], k, batch_windows, src.transform, return_window)
+                n, k, batch_windows = n + 1, 0, []
+
+        if k > 0:
+            yield _batch(pool[n % buffers], k, batch_windows, src.transform, return_window)
+
+
+def load_prefetch(path : str, patch_shape : tuple = (64,64), prefetch : int = 8, workers : int = 4, dtype : str = None,
+                  stride : tuple = None, padding : str = None, fill_value : float = None, return_window : bool = False,
+                  min_valid : float = None) -> np.ndarray:
+    '''
+        Load an image patch by patch, reading the upcoming patches in background threads
+
+        Same patches, in the same order, as load, but up to prefetch patches are read ahead by a pool
+        of worker threads (each with its own open handle on the image), so that reading and decoding
+        overlap with the processing of the current patch. Patches with less than min_valid valid pixels
+        are skipped as in load. PNG and JPEG decoders are sequential, load is
+        usually faster for them.
+
+        Supported data format
+
+        RASTERIO_EXTENSIONS   = ['.tif', '.tiff']
+        MATPLOTLIB_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.jp2']
+
+        Parameters:
+        -----------
+            - path : str
+                position of the image, if None the function will ask for the image path using a menu
+            - patch_shape :  tuple[int,int]
+                tuple of two integers representing the size of the patches to be loaded from the image
+            - prefetch : int
+                maximum number of patches read ahead (default : 8)
+            - workers : int
+                number of reading threads (default : 4)
+            - dtype : str
+                dtype of the patches, if None the image dtype is used (default : None)
+            - stride : tuple[int,int]
+                tuple of two integers representing the step between patches, if None it is patch_shape (default : None)
+            - padding : str
+                numpy.pad mode used for the patches crossing the image edges, if None they are skipped (default : None)
+            - fill_value : float
+                value used by the 'constant' padding, if None the image nodata or 0 (default : None)
+            - return_window : bool
+                if True yield (data, window, transform) instead of data (default : False)
+            - min_valid : float
+                minimum fraction (0-1) of valid pixels of the patches, if None all the patches are returned (default : None)
+
+        Returns:
+        --------
+            - data : np.ndarray
+                patch_shape[0]xpatch_shape[1]xB image patch, with patch_shape[0] width, patch_shape[1] height and B bands
+            - window : rasterio.windows.Window
+                window of the patch in the image (may extend beyond the image if padding is used), only if return_window
+            - transform : Affine
+                affine transform of the patch, only if return_window
+
+        Usage:
+        ------
+        ```python
+        for patch in load_prefetch('path/to/image.tif', patch_shape=(256, 256), prefetch=16, workers=4):
+            prediction = model(patch)
+        ```
+    '''
+
+    RASTERIO_EXTENSIONS   = ['.tif', '.tiff']
+    MATPLOTLIB_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.jp2']
+
+    if path is None:
+        path = get_path_gui()
+
+    if not any(frmt in path for frmt in RASTERIO_EXTENSIONS + MATPLOTLIB_EXTENSIONS):
+        raise Exception('Error: file can not be opened or format not supported!')
+    if prefetch < 1 or workers < 1:
+        raise Exception('Error: prefetch and workers must be grather than 0')
+
+    with rasterio.open(path) as src:
+        c, h, w = src.count, src.height, src.width
+        dtype = dtype if dtype is not None else src.dtypes[0]
+        fill_value = _fill_value(src, fill_value)
+        transform = src.transform
+        valid = _ValidGrid(src, patch_shape, dtype) if min_valid is not None else None
+
+    patches = (Window(j, i, patch_shape[1], patch_shape[0])
+               for i, offsets in _patch_rows(h, w, patch_shape, stride, padding, valid, min_valid) for j in offsets)
+    handles = _ThreadHandles(path)
+
+    def read(window):
+        data = np.empty((patch_shape[0], patch_shape[1], c), dtype=dtype)
+        return _read_patch(handles.get(), data, window, padding, fill_value)
+
+    def result(future, window):
+        data = future.result()
+        if valid is not None and valid.per_patch:
+            inside = data[:min(patch_shape[0], h - int(window.row_off)), :min(patch_shape[1], w - int(window.col_off))]
+            if valid.patch_fraction(inside) < min_valid:
+                return None
+        if return_window:
+            return data, window, windows.transform(window, transform)
+        return data
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    queue = deque()
+    try:
+        for window in patches:
+            queue.append((executor.submit(read, window), window))
+            if len(queue) >= prefetch:
+                item = result(*queue.popleft())
+                if item is not None:
+                    yield item
+        while len(queue) > 0:
+            item = result(*queue.popleft())
+            if item is not None:
+                yield item
+    finally:
+        for future, _ in queue:
+            future.cancel()
+        executor.shutdown(wait=True)
+        handles.close()
+
+
+def _iter_blocks(src : rasterio.io.DatasetReader, patch_shape : tuple, stride : tuple, padding : str, min_valid : float = None):
+    '''
+        Walk the patch grid of an open dataset, reading it in block-aligned strips: yield the part of each
+        patch inside the image (a view on the strip) and the window of the patch
+    '''
+    strip = _BlockStrip(src)
+    valid = _ValidGrid(src, patch_shape) if min_valid is not None else None
+
+    for i, offsets in _patch_rows(src.height, src.width, patch_shape, stride, padding, valid, min_valid):
+        rows = strip.rows(i, min(i + patch_shape[0], src.height))
+        for j in offsets:
+            block = rows[:, j:j + patch_shape[1], :]
+            if valid is not None and valid.per_patch and valid.patch_fraction(block) < min_valid:
+                continue
+            yield block, Window(j, i, patch_shape[1], patch_shape[0])
+
+
+def _batch(buffer : np.ndarray, size : int, batch_windows : list, transform, return_window : bool):
+    batch = buffer[:size] if size < buffer.shape[0] else buffer
+    if return_window:
+        return batch, batch_windows, [windows.transform(window, transform) for window in batch_windows]
+    return batch
+
+
+def _patch_rows(height : int, width : int, patch_shape : tuple, stride : tuple = None, padding : str = None,
+                valid = None, min_valid : float = None):
+    '''
+        Row offsets of the patch grid, each with the column offsets of the patches in that row; with a
+        _ValidGrid only the patches with at least min_valid valid pixels (and the rows having any) are kept
+    '''
+    if stride is None:
+        stride = patch_shape
+    if patch_shape[0] < 1 or patch_shape[1] < 1 or stride[0] < 1 or stride[1] < 1:
+        raise Exception('Error: patch_shape and stride must be grather than 0')
+
+    columns = _offsets(width, patch_shape[1], stride[1], padding)
+    for i in _offsets(height, patch_shape[0], stride[0], padding):
+        if valid is None:
+            yield i, columns
+        else:
+            offsets = [j for j in columns if valid.fraction(i, j) >= min_valid]
+            if len(offsets) > 0:
+                yield i, offsets
+
+
+def _offsets(size : int, patch : int, stride : int, padding : str) -> list:
+    '''
+        Patch offsets along one axis: patches fully inside the axis, or, with padding, enough patches
+        to cover it entirely (starting inside the axis, a stride larger than the patch leaves gaps)
+    '''
+    if padding is None:
+        return list(range(0, size - patch + 1, stride))
+    return [k * stride for k in range(-(-max(size - patch, 0) // stride) + 1) if k * stride < size]
+
+
+def _fill_value(src : rasterio.io.DatasetReader, fill_value : float) -> float:
+    if fill_value is not None:
+        return fill_value
+    return src.nodata if src.nodata is not None else 0
+
+
+def _fill_patch(data : np.ndarray, block : np.ndarray, padding : str, fill_value : float) -> np.ndarray:
+    '''
+        Copy block (the part of the patch inside the image) into data, padding the missing rows/columns
+    '''
+    h, w = block.shape[:2]
+    if (h, w) == data.shape[:2]:
+        data[...] = block
+    elif padding == 'constant':
+        data[...] = fill_value
+        data[:h, :w] = block
+    else:
+        data[...] = np.pad(block, ((0, data.shape[0] - h), (0, data.shape[1] - w), (0, 0)), mode=padding)
+    return data
+
+
+def _read_patch(src : rasterio.io.DatasetReader, data : np.ndarray, window : Window, padding : str, fill_value : float) -> np.ndarray:
+    '''
+        Read the window of a patch into data, padding the part outside of the image
+    '''
+    height = min(int(window.height), src.height - int(window.row_off))
+    width = min(int(window.width), src.width - int(window.col_off))
+    if (height, width) == data.shape[:2]:
+        return _read_into(src, data, list(range(1, src.count + 1)), window)
+
+    block = np.empty((height, width, src.count), dtype=data.dtype)
+    _read_into(src, block, list(range(1, src.count + 1)), Window(window.col_off, window.row_off, width, height))
+    return _fill_patch(data, block, padding, fill_value)
+
+
+class _ThreadHandles:
+    '''
+        One rasterio handle per thread on the same file (rasterio datasets are not thread-safe)
+    '''
+
+    def __init__(self, path : str) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._handles = []
+        self._lock = threading.Lock()
+
+    def get(self) -> rasterio.io.DatasetReader:
+        src = getattr(self._local, 'src', None)
+        if src is None:
+            src = rasterio.open(self.path)
+            self._local.src = src
+            with self._lock:
+                self._handles.append(src)
+        return src
+
+    def close(self) -> None:
+        with self._lock:
+            for src in self._handles:
+                src.close()
+            self._handles = []
+
+
+class _BlockStrip:
+    '''
+        Row strip of a dataset aligned to its internal blocks, sliding down the image: rows already
+        decoded in the current strip are reused when the strip moves, so every block is read once
+    '''
+
+    def __init__(self, src : rasterio.io.DatasetReader) -> None:
+        self.src = src
+        self.block_rows = src.block_shapes[0][0]
+        self.indexes = list(range(1, src.count + 1))
+        self.start, self.stop = 0, 0
+        self.data = np.empty((0, src.width, src.count), dtype=src.dtypes[0])
+
+    def rows(self, start : int, stop : int) -> np.ndarray:
+        '''
+            Return a (stop - start)xWxB view of the image rows [start, stop)
+        '''
+        if start < self.start or stop > self.stop:
+            new_start = (start // self.block_rows) * self.block_rows
+            new_stop = min(self.src.height, -(-stop // self.block_rows) * self.block_rows)
+            data = np.empty((new_stop - new_start, self.src.width, self.src.count), dtype=self.data.dtype)
+
+            # Reuse the rows shared with the current strip, read only the new ones
+            keep_start, keep_stop = max(new_start, self.start), min(new_stop, self.stop)
+            if keep_start < keep_stop:
+                data[keep_start - new_start:keep_stop - new_start] = self.data[keep_start - self.start:keep_stop - self.start]
+                if new_start < keep_start:
+                    _read_into(self.src, data[:keep_start - new_start], self.indexes, Window(0, new_start, self.src.width, keep_start - new_start))
+                if keep_stop < new_stop:
+                    _read_into(self.src, data[keep_stop - new_start:], self.indexes, Window(0, keep_stop, self.src.width, new_stop - keep_stop))
+            else:
+                _read_into(self.src, data, self.indexes, Window(0, new_start, self.src.width, new_stop - new_start))
+
+            self.start, self.stop, self.data = new_start, new_stop, data
+
+        return self.data[start - self.start:stop - self.start]
+
+
+class _ValidGrid:
+    '''
+        Valid-pixel fraction of the patches of a dataset. With overviews, or an alpha band or internal
+        mask, a low-resolution copy of the dataset mask is read once (GDAL serves it from the mask
+        overviews, or decodes only the mask) and patches are filtered before being read. A nodata mask
+        without overviews would need a decode of every block of every band: per_patch is then True and
+        the fraction is computed on the pixels of each patch (in dtype) once read, with patch_fraction.
+    '''
+
+    def __init__(self, src : rasterio.io.DatasetReader, patch_shape : tuple, dtype : str = None) -> None:
+        self.height, self.width = src.height, src.width
+        self.patch_shape = patch_shape
+        # About 8x8 mask pixels per patch
+        self.factor = max(1, min(patch_shape) // 8)
+        self.mask = None
+        self.nodata = None
+
+        if src.nodata is None and all(flags == [MaskFlags.all_valid] for flags in src.mask_flag_enums):
+            pass
+        elif len(src.overviews(1)) == 0 and _nodata_only(src, dtype if dtype is not None else src.dtypes[0]):
+            self.nodata = src.nodata
+        else:
+            out_shape = (-(-src.height // self.factor), -(-src.width // self.factor))
+            self.mask = src.dataset_mask(out_shape=out_shape) > 0
+
+    @property
+    def per_patch(self) -> bool:
+        '''
+            True if the fraction has to be computed on the pixels of each patch
+        '''
+        return self.nodata is not None
+
+    def patch_fraction(self, block : np.ndarray) -> float:
+        '''
+            Fraction of valid pixels of a patch from its pixels inside the image (hxwxB block)
+        '''
+        if np.isnan(self.nodata):
+            invalid = np.isnan(block).all(axis=-1)
+        else:
+            invalid = (block == self.nodata).all(axis=-1)
+        return (invalid.size - np.count_nonzero(invalid)) / (self.patch_shape[0] * self.patch_shape[1])
+
+    def fraction(self, row : int, col : int) -> float:
+        '''
+            Estimated fraction of valid pixels of the patch at (row, col), pixels outside of the image are not valid
+        '''
+        row_stop = min(row + self.patch_shape[0], self.height)
+        col_stop = min(col + self.patch_shape[1], self.width)
+        inside = (row_stop - row) * (col_stop - col) / (self.patch_shape[0] * self.patch_shape[1])
+        if self.mask is None:
+            return inside
+
+        f = self.factor
+        region = self.mask[row // f:-(-row_stop // f), col // f:-(-col_stop // f)]
+        if region.size == 0:
+            return 0.0
+        return float(region.mean()) * inside
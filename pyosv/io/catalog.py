@@ -0,0 +1,315 @@
+from .chunk_store import _encode_profile, _decode_profile
+
+from concurrent.futures import ThreadPoolExecutor
+from rasterio.warp import transform_bounds
+from rasterio.coords import BoundingBox
+from rasterio.crs import CRS
+import datetime
+import sqlite3
+import rasterio
+import json
+import os
+import re
+
+
+CATALOG_EXTENSIONS = ['.tif', '.tiff', '.geotiff', '.jp2']
+
+_DATE_PATTERN = re.compile(r'(?<!\d)(\d{4})-?(\d{2})-?(\d{2})(?!\d)')
+
+# Metadata items of the sensors holding the acquisition (not the file creation) time
+_ACQUISITION_TAGS = ['ACQUISITION_DATE', 'ACQUISITIONDATETIME', 'DATE_ACQUIRED', 'SENSING_TIME',
+                     'DATATAKE_1_DATATAKE_SENSING_START', 'PRODUCT_START_TIME']
+
+_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS rasters (
+        id      INTEGER PRIMARY KEY,
+        path    TEXT UNIQUE NOT NULL,
+        mtime   REAL NOT NULL,
+        size    INTEGER NOT NULL,
+        driver  TEXT,
+        crs     TEXT,
+        width   INTEGER,
+        height  INTEGER,
+        count   INTEGER,
+        dtype   TEXT,
+        left    REAL,
+        bottom  REAL,
+        right   REAL,
+        top     REAL,
+        date    TEXT,
+        profile TEXT
+    );
+    CREATE INDEX IF NOT EXISTS rasters_date ON rasters (date);
+    CREATE VIRTUAL TABLE IF NOT EXISTS rasters_bounds USING rtree (id, min_lon, max_lon, min_lat, max_lat);
+'''
+
+_COLUMNS = ['path', 'mtime', 'size', 'driver', 'crs', 'width', 'height', 'count', 'dtype', 'left', 'bottom', 'right', 'top', 'date', 'profile']
+
+
+class Catalog:
+    '''
+        Persistent, metadata-only index of the rasters in a directory tree.
+
+        Profile, CRS, bounds, band count, dtype and acquisition date of every raster are stored in
+        an SQLite database, without reading pixels. Footprints are indexed in an R*Tree in WGS84
+        (EPSG:4326) so that bbox and date queries take milliseconds even for hundreds of thousands
+        of files. Rescans are incremental: only files whose mtime or size changed are read again.
+
+        The acquisition date is taken from the first YYYY-MM-DD or YYYYMMDD date found in the file
+        name, or else from the acquisition metadata of the sensor (e.g. ACQUISITION_DATE, DATE_ACQUIRED);
+        TIFFTAG_DATETIME is not used, it is the time the file was written.
+
+        Parameters:
+        -----------
+            - path : str
+                position of the SQLite database, created if it does not exist
+
+        Usage:
+        ------
+        ```python
+        with Catalog('path/to/catalog.sqlite') as catalog:
+            catalog.scan('path/to/scenes')
+            rasters = catalog.query(bbox=(10.7, 45.7, 11.0, 45.9), start='2019-06-01', end='2019-06-30')
+        ```
+
+        Output:
+        -------
+        ```
+        [{'path': 'path/to/scenes/S2-...-2019-06-21.tif', 'crs': 'EPSG:32632', 'count': 13, 'dtype': 'uint16',
+          'date': '2019-06-21', 'bounds': BoundingBox(left=638640.0, bottom=5074190.0, right=649070.0, top=5084590.0), ...}]
+        ```
+    '''
+
+    def __init__(self, path : str) -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        '''
+            Close the database
+        '''
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute('SELECT COUNT(*) FROM rasters').fetchone()[0]
+
+    def scan(self, root : str, extensions : list = CATALOG_EXTENSIONS, max_workers : int = 8) -> dict:
+        '''
+            Index (or re-index) all the rasters in a directory tree
+
+            Files already in the catalog with unchanged mtime and size are skipped, files that
+            no longer exist under root are removed from the catalog.
+
+            Parameters:
+            -----------
+                - root : str
+                    directory to be scanned recursively
+                - extensions : list
+                    extensions of the files to be indexed (default : CATALOG_EXTENSIONS)
+                - max_workers : int
+                    number of threads reading file headers (default : 8)
+
+            Returns:
+            --------
+                - counts : dict
+                    number of 'added', 'updated', 'removed', 'unchanged' and 'failed' files
+
+            Usage:
+            ------
+            ```python
+            catalog.scan('path/to/scenes')
+            ```
+
+            Output:
+            -------
+            ```
+            {'added': 1250, 'updated': 3, 'removed': 0, 'unchanged': 48211, 'failed': 0}
+            ```
+        '''
+
+        root = os.path.abspath(root)
+        known = {row[0] : (row[1], row[2], row[3]) for row in
+                 self._conn.execute('SELECT path, mtime, size, id FROM rasters WHERE substr(path, 1, ?) = ?',
+                                     (len(root) + 1, root + os.sep))}
+
+        counts = {'added' : 0, 'updated' : 0, 'removed' : 0, 'unchanged' : 0, 'failed' : 0}
+        to_read = []
+        seen = set()
+
+        for directory, _, files in os.walk(root):
+            for name in files:
+                if not any(name.lower().endswith(frmt) for frmt in extensions):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # Removed while scanning
+                    continue
+                seen.add(path)
+                if path in known and known[path][0] == stat.st_mtime and known[path][1] == stat.st_size:
+                    counts['unchanged'] += 1
+                else:
+                    to_read.append((path, stat))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            records = executor.map(lambda item: _read_record(*item), to_read)
+
+            with self._conn:
+                for (path, _), record in zip(to_read, records):
+                    if record is None:
+                        counts['failed'] += 1
+                        continue
+                    if path in known:
+                        self._delete(known[path][2])
+                        counts['updated'] += 1
+                    else:
+                        counts['added'] += 1
+                    self._insert(record)
+
+        with self._conn:
+            for path in set(known) - seen:
+                self._delete(known[path][2])
+                counts['removed'] += 1
+
+        return counts
+
+    def query(self, bbox : tuple = None, crs : str = 'EPSG:4326', start = None, end = None) -> list:
+        '''
+            Find the rasters intersecting a bounding box and/or acquired within a date range
+
+            Parameters:
+            -----------
+                - bbox : tuple
+                    (left, bottom, right, top) bounding box, if None no spatial filter is applied (default : None)
+                - crs : str
+                    coordinate reference system of bbox (default : 'EPSG:4326')
+                - start : str or datetime.date
+                    first acquisition date (inclusive), if None no lower bound is applied (default : None)
+                - end : str or datetime.date
+                    last acquisition date (inclusive), if None no upper bound is applied (default : None)
+
+            Returns:
+            --------
+                - rasters : list
+                    list of dictionaries with path, crs, width, height, count, dtype, date, bounds (in the
+                    raster CRS) and profile of the matching rasters, sorted by date and path
+
+            Usage:
+            ------
+            ```python
+            rasters = catalog.query(bbox=(10.7, 45.7, 11.0, 45.9), start='2019-06-01')
+            ```
+        '''
+
+        sql = 'SELECT r.* FROM rasters r'
+        conditions, parameters = [], []
+
+        if bbox is not None:
+            if crs is not None and CRS.from_user_input(crs) != CRS.from_epsg(4326):
+                bbox = transform_bounds(crs, 'EPSG:4326', *bbox, densify_pts=21)
+            sql += ' JOIN rasters_bounds b ON b.id = r.id'
+            conditions += ['b.max_lon >= ?', 'b.min_lon <= ?', 'b.max_lat >= ?', 'b.min_lat <= ?']
+            parameters += [bbox[0], bbox[2], bbox[1], bbox[3]]
+
+        if start is not None:
+            conditions.append('r.date >= ?')
+            parameters.append(_to_date(start))
+        if end is not None:
+            conditions.append('r.date <= ?')
+            parameters.append(_to_date(end))
+
+        if len(conditions) > 0:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY r.date, r.path'
+
+        cursor = self._conn.execute(sql, parameters)
+        names = [d[0] for d in cursor.description]
+        return [_to_result(dict(zip(names, row))) for row in cursor]
+
+    def _insert(self, record : dict) -> None:
+        cursor = self._conn.execute('INSERT INTO rasters ({}) VALUES ({})'.format(
+            ', '.join(_COLUMNS), ', '.join('?' * len(_COLUMNS))), [record[c] for c in _COLUMNS])
+        if record['wgs84'] is not None:
+            w = record['wgs84']
+            self._conn.execute('INSERT INTO rasters_bounds VALUES (?, ?, ?, ?, ?)', (cursor.lastrowid, w[0], w[2], w[1], w[3]))
+
+    def _delete(self, rowid : int) -> None:
+        self._conn.execute('DELETE FROM rasters WHERE id = ?', (rowid,))
+        self._conn.execute('DELETE FROM rasters_bounds WHERE id = ?', (rowid,))
+
+
+def _read_record(path : str, stat : os.stat_result) -> dict:
+    '''
+        Read the header of a raster into a catalog record, None if the file can not be opened
+    '''
+    try:
+        with rasterio.open(path) as src:
+            profile = src.profile
+            bounds = src.bounds
+            crs = src.crs
+            tags = src.tags()
+    except (rasterio.errors.RasterioError, OSError):
+        return None
+
+    wgs84 = None
+    if crs is not None:
+        try:
+            wgs84 = transform_bounds(crs, 'EPSG:4326', *bounds, densify_pts=21)
+        except (rasterio.errors.RasterioError, ValueError):
+            # Indexed without geographic bounds, as rasters without CRS
+            wgs84 = None
+
+    return {
+        'path'    : path,
+        'mtime'   : stat.st_mtime,
+        'size'    : stat.st_size,
+        'driver'  : profile['driver'],
+        'crs'     : crs.to_string() if crs is not None else None,
+        'width'   : profile['width'],
+        'height'  : profile['height'],
+        'count'   : profile['count'],
+        'dtype'   : profile['dtype'],
+        'left'    : bounds.left,
+        'bottom'  : bounds.bottom,
+        'right'   : bounds.right,
+        'top'     : bounds.top,
+        'date'    : _acquisition_date(path, tags),
+        'profile' : json.dumps(_encode_profile(profile)),
+        'wgs84'   : wgs84,
+    }
+
+
+def _acquisition_date(path : str, tags : dict) -> str:
+    '''
+        Acquisition date as YYYY-MM-DD, from the file name or the acquisition tags, None if not found
+    '''
+    candidates = [os.path.basename(path)] + [str(tags[tag]) for tag in _ACQUISITION_TAGS if tag in tags]
+    for candidate in candidates:
+        for match in _DATE_PATTERN.finditer(candidate.replace(':', '-')):
+            try:
+                return datetime.date(*[int(g) for g in match.groups()]).isoformat()
+            except ValueError:
+                continue
+    return None
+
+
+def _to_date(date) -> str:
+    if isinstance(date, (datetime.date, datetime.datetime)):
+        return date.strftime('%Y-%m-%d')
+    return str(date)
+
+
+def _to_result(row : dict) -> dict:
+    result = {k : row[k] for k in ['path', 'crs', 'width', 'height', 'count', 'dtype', 'date']}
+    result['bounds'] = BoundingBox(row['left'], row['bottom'], row['right'], row['top'])
+    result['profile'] = _decode_profile(json.loads(row['profile']))
+    return result
@@ -0,0 +1,547 @@
+from .raster import _normalize_key, _axis_selection, _check_index, _selection_length
+
+from rasterio.coords import BoundingBox
+from rasterio.windows import Window
+from rasterio.crs import CRS
+from concurrent.futures import ThreadPoolExecutor
+from affine import Affine
+import numpy as np
+import threading
+import shutil
+import lzma
+import zlib
+import json
+import bz2
+import os
+
+
+CHUNK_STORE_EXTENSION = '.osv'
+CHUNK_STORE_METADATA  = 'metadata.json'
+CHUNK_COMPRESSIONS    = ['zlib', 'lzma', 'bz2']
+
+
+class ChunkStore:
+    '''
+        pyosv-native chunked cube stored as a directory.
+
+        The HxWxB cube is split in fixed-size spatial/band chunks, each saved as an independent
+        channel-last file; a JSON sidecar (metadata.json) carries shape, dtype, chunk size,
+        compression, profile and bounds. Uncompressed chunks are .npy files memory-mapped when
+        read, so iterating a store chunk by chunk does not copy data into RAM; compressed chunks
+        (zlib, lzma or bz2, after an optional byte shuffle) are decompressed independently, so
+        random chunk access only decodes the chunks it touches. Missing chunks read as the nodata
+        value (or 0).
+
+        Every chunk is written to a temporary file and atomically renamed, and the sidecar is only
+        written when the store is created: several threads or processes can write disjoint chunks
+        of the same store at the same time without any locking.
+
+        Layout:
+        -------
+        ```
+        cube.osv/
+            metadata.json
+            0.0.0.npy       (row chunk 0, column chunk 0, band chunk 0)
+            0.0.1.npy
+            0.1.0.npy
+            ...
+        ```
+        (compressed chunks have the compression as extension, e.g. 0.0.0.zlib)
+
+        Parameters:
+        -----------
+            - path : str
+                position of the store (a directory, usually with .osv extension)
+
+        Attributes:
+        -----------
+            - path : str
+                position of the store
+            - shape : tuple
+                (H, W, B) shape of the cube, with H height, W width and B bands
+            - dtype : np.dtype
+                data type of the cube
+            - chunks : tuple
+                (rows, cols, bands) size of the chunks
+            - grid : tuple
+                (rows, cols, bands) number of chunks along each axis
+            - compression : dict
+                compression of the chunks ({'id', 'level', 'shuffle'}), None if they are not compressed
+            - profile : dict
+                rasterio-like profile of the cube (may be None)
+            - bounds : BoundingBox
+                geo bounds of the cube (may be None)
+
+        Usage:
+        ------
+        ```python
+        store = ChunkStore.from_array('path/to/cube.osv', img, chunks=(512, 512, 4), profile=meta, bounds=bounds,
+                                      compression='zlib', max_workers=8)
+
+        store = ChunkStore('path/to/cube.osv')
+        for i, j, window, chunk in store.iter_chunks():
+            process(chunk)
+
+        patch = store[1024:1088, 2048:2112, :]
+        ```
+    '''
+
+    def __init__(self, path : str) -> None:
+        metadata_path = os.path.join(path, CHUNK_STORE_METADATA)
+        if not os.path.isfile(metadata_path):
+            raise Exception('Error: {} is not a pyosv chunk store!'.format(path))
+
+        with open(metadata_path, 'r') as f:
+            metadata = json.load(f)
+
+        self.path        = path
+        self.shape       = tuple(metadata['shape'])
+        self.dtype       = np.dtype(metadata['dtype'])
+        self.profile     = _decode_profile(metadata['profile'])
+        self.bounds      = BoundingBox(*metadata['bounds']) if metadata['bounds'] is not None else None
+        self.compression = metadata['compression']
+        self.chunks      = tuple(metadata['chunks'])
+        self.grid        = tuple(-(-n // c) for n, c in zip(self.shape, self.chunks))
+
+        nodata = self.profile.get('nodata') if self.profile is not None else None
+        self.fill_value = nodata if nodata is not None else 0
+
+    @classmethod
+    def create(cls, path : str, shape : tuple, dtype : str, chunks : tuple = (512, 512), profile : dict = None, bounds : list = None,
+               compression : str = None, level : int = None, shuffle : bool = True, overwrite : bool = False):
+        '''
+            Create an empty chunk store
+
+            Parameters:
+            -----------
+                - path : str
+                    position of the store to create
+                - shape : tuple
+                    (H, W, B) shape of the cube, with H height, W width and B bands
+                - dtype : str
+                    data type of the cube
+                - chunks : tuple
+                    (rows, cols) or (rows, cols, bands) size of the chunks, all the bands in one chunk if
+                    bands is not given (default : (512, 512))
+                - profile : dict
+                    rasterio profile to be saved with the cube (default : None)
+                - bounds : list
+                    geo bounds to be saved with the cube (default : None)
+                - compression : str
+                    compression of each chunk, one of CHUNK_COMPRESSIONS, if None chunks are not compressed (default : None)
+                - level : int
+                    compression level, if None the default of the compressor (default : None)
+                - shuffle : bool
+                    if True shuffle the bytes of the values before compressing them (default : True)
+                - overwrite : bool
+                    if True remove an existing store at path, otherwise an existing store must have the same
+                    shape, dtype, chunks and compression, and its chunks are kept (default : False)
+
+            Returns:
+            --------
+                - store : ChunkStore
+                    the new, empty, store
+
+            Usage:
+            ------
+            ```python
+            store = ChunkStore.create('path/to/cube.osv', (10980, 10980, 13), 'uint16', chunks=(512, 512, 1), compression='zlib')
+            ```
+        '''
+
+        if len(shape) != 3:
+            raise Exception('Error: lenght of shape must be 3 - (space, space, channels)')
+        if len(chunks) not in (2, 3) or any(c < 1 for c in chunks):
+            raise Exception('Error: chunks must be two or three integers grather than 0')
+        if compression is not None and compression not in CHUNK_COMPRESSIONS:
+            raise Exception('Error: compression must be one of {}'.format(CHUNK_COMPRESSIONS))
+
+        chunks = list(chunks) + ([shape[2]] if len(chunks) == 2 else [])
+
+        metadata = {
+            'shape'       : [int(s) for s in shape],
+            'dtype'       : np.dtype(dtype).str,
+            'chunks'      : [int(c) for c in chunks],
+            'compression' : {'id' : compression, 'level' : level, 'shuffle' : bool(shuffle)} if compression is not None else None,
+            'profile'     : _encode_profile(profile),
+            'bounds'      : list(bounds) if bounds is not None else None,
+        }
+
+        metadata_path = os.path.join(path, CHUNK_STORE_METADATA)
+        if os.path.isfile(metadata_path):
+            if overwrite:
+                shutil.rmtree(path)
+            else:
+                # The existing chunks are only valid for the same layout
+                with open(metadata_path) as f:
+                    existing = json.load(f)
+                if any(existing.get(key) != metadata[key] for key in ['shape', 'dtype', 'chunks', 'compression']):
+                    raise Exception('Error: a store with a different shape, dtype, chunks or compression exists at {}, use overwrite=True'.format(path))
+
+        os.makedirs(path, exist_ok=True)
+        _atomic_write_text(os.path.join(path, CHUNK_STORE_METADATA), json.dumps(metadata, indent=4))
+
+        return cls(path)
+
+    @classmethod
+    def from_array(cls, path : str, data : np.ndarray, chunks : tuple = (512, 512), profile : dict = None, bounds : list = None,
+                   compression : str = None, level : int = None, shuffle : bool = True, overwrite : bool = False, max_workers : int = 1):
+        '''
+            Save an HxWxB array as a chunk store
+
+            Parameters:
+            -----------
+                - path : str
+                    position of the store to create
+                - data : np.ndarray
+                    HxWxB array to be saved, with H height, W width and B bands
+                - chunks : tuple
+                    (rows, cols) or (rows, cols, bands) size of the chunks (default : (512, 512))
+                - profile : dict
+                    rasterio profile to be saved with the cube (default : None)
+                - bounds : list
+                    geo bounds to be saved with the cube (default : None)
+                - compression : str
+                    compression of each chunk, one of CHUNK_COMPRESSIONS, if None chunks are not compressed (default : None)
+                - level : int
+                    compression level, if None the default of the compressor (default : None)
+                - shuffle : bool
+                    if True shuffle the bytes of the values before compressing them (default : True)
+                - overwrite : bool
+                    if True remove an existing store at path first, otherwise an existing store must have the
+                    same shape, dtype, chunks and compression (default : False)
+                - max_workers : int
+                    number of threads compressing and writing chunks in parallel (default : 1)
+
+            Returns:
+            --------
+                - store : ChunkStore
+                    the new store
+
+            Usage:
+            ------
+            ```python
+            img, meta, bounds = pyosv.io.reader.load('path/to/image.tif')
+            store = ChunkStore.from_array('path/to/cube.osv', img, profile=meta, bounds=bounds)
+            ```
+        '''
+
+        store = cls.create(path, data.shape, data.dtype, chunks, profile, bounds, compression, level, shuffle, overwrite)
+
+        def write(index):
+            i, j, k = index
+            window = store.chunk_window(i, j)
+            b0, b1 = store.band_range(k)
+            store.write_chunk(i, j, data[window.row_off:window.row_off + window.height,
+                                         window.col_off:window.col_off + window.width, b0:b1], k)
+
+        indices = [(i, j, k) for i in range(store.grid[0]) for j in range(store.grid[1]) for k in range(store.grid[2])]
+        if max_workers > 1:
+            # Chunks are independent files: no locking is needed
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(write, indices))
+        else:
+            for index in indices:
+                write(index)
+        return store
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __repr__(self) -> str:
+        return '<ChunkStore {} shape={} dtype={} chunks={}>'.format(self.path, self.shape, self.dtype, self.chunks)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        data = self[...]
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        return data
+
+    def chunk_path(self, i : int, j : int, k : int = 0) -> str:
+        '''
+            Position of the file of chunk (i, j, k)
+        '''
+        extension = self.compression['id'] if self.compression is not None else 'npy'
+        return os.path.join(self.path, '{}.{}.{}.{}'.format(i, j, k, extension))
+
+    def band_range(self, k : int) -> tuple:
+        '''
+            (start, stop) bands covered by band chunk k
+        '''
+        if k < 0 or k >= self.grid[2]:
+            raise Exception('Error: band chunk {} is out of the chunk grid {}'.format(k, self.grid))
+        return k * self.chunks[2], min((k + 1) * self.chunks[2], self.shape[2])
+
+    def chunk_window(self, i : int, j : int) -> Window:
+        '''
+            Window covered by chunk (i, j)
+        '''
+        if i < 0 or i >= self.grid[0] or j < 0 or j >= self.grid[1]:
+            raise Exception('Error: chunk ({}, {}) is out of the chunk grid {}'.format(i, j, self.grid))
+
+        row_off, col_off = i * self.chunks[0], j * self.chunks[1]
+        height = min(self.chunks[0], self.shape[0] - row_off)
+        width  = min(self.chunks[1], self.shape[1] - col_off)
+        return Window(col_off, row_off, width, height)
+
+    def read_chunk(self, i : int, j : int, k : int = None) -> np.ndarray:
+        '''
+            Read chunk (i, j, k), as a read-only memory map (no copy) if it is not compressed; missing
+            chunks are filled with fill_value
+
+            Parameters:
+            -----------
+                - i : int
+                    chunk row index
+                - j : int
+                    chunk column index
+                - k : int
+                    band chunk index, if None all the bands of the spatial chunk (i, j) are read (default : None)
+
+            Returns:
+            --------
+                - data : np.ndarray
+                    hxwxb chunk, with h <= chunks[0], w <= chunks[1] and b <= chunks[2] (b = B if k is None)
+
+            Usage:
+            ------
+            ```python
+            chunk = store.read_chunk(0, 0)
+            ```
+        '''
+
+        if k is None:
+            if self.grid[2] == 1:
+                return self.read_chunk(i, j, 0)
+            return np.concatenate([self.read_chunk(i, j, k) for k in range(self.grid[2])], axis=2)
+
+        window = self.chunk_window(i, j)
+        b0, b1 = self.band_range(k)
+        shape = (window.height, window.width, b1 - b0)
+        path = self.chunk_path(i, j, k)
+
+        if not os.path.isfile(path):
+            return np.full(shape, self.fill_value, dtype=self.dtype)
+
+        if self.compression is None:
+            return np.load(path, mmap_mode='r')
+
+        with open(path, 'rb') as f:
+            raw = _decompress(f.read(), self.compression, self.dtype.itemsize)
+        return np.frombuffer(raw, dtype=self.dtype).reshape(shape)
+
+    def write_chunk(self, i : int, j : int, data : np.ndarray, k : int = None) -> None:
+        '''
+            Write chunk (i, j, k), atomically
+
+            Parameters:
+            -----------
+                - i : int
+                    chunk row index
+                - j : int
+                    chunk column index
+                - data : np.ndarray
+                    hxwxb chunk, with the exact size of the chunk window and bands
+                - k : int
+                    band chunk index, if None data has all the bands of the spatial chunk (i, j) (default : None)
+
+            Returns:
+            --------
+            Nothing, the chunk will be saved
+
+            Usage:
+            ------
+            ```python
+            store.write_chunk(0, 0, chunk)
+            ```
+        '''
+
+        window = self.chunk_window(i, j)
+        if k is None:
+            if data.shape != (window.height, window.width, self.shape[2]):
+                raise Exception('Error: chunk ({}, {}) must have shape {}, got {}'.format(
+                    i, j, (window.height, window.width, self.shape[2]), data.shape))
+            for k in range(self.grid[2]):
+                b0, b1 = self.band_range(k)
+                self.write_chunk(i, j, data[:, :, b0:b1], k)
+            return
+
+        b0, b1 = self.band_range(k)
+        if data.shape != (window.height, window.width, b1 - b0):
+            raise Exception('Error: chunk ({}, {}, {}) must have shape {}, got {}'.format(
+                i, j, k, (window.height, window.width, b1 - b0), data.shape))
+
+        # Temporary names are unique per process and thread, the rename is atomic
+        path = self.chunk_path(i, j, k)
+        tmp = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+        data = np.ascontiguousarray(data, dtype=self.dtype)
+        with open(tmp, 'wb') as f:
+            if self.compression is None:
+                np.save(f, data)
+            else:
+                f.write(_compress(data.tobytes(), self.compression, self.dtype.itemsize))
+        os.replace(tmp, path)
+
+    def iter_chunks(self):
+        '''
+            Iterate over the chunks of the store in row-major order
+
+            Returns:
+            --------
+                - (i, j, window, data) : tuple
+                    chunk indices, window covered by the chunk and memory-mapped hxwxB chunk data
+
+            Usage:
+            ------
+            ```python
+            for i, j, window, chunk in store.iter_chunks():
+                process(chunk)
+            ```
+        '''
+        for i in range(self.grid[0]):
+            for j in range(self.grid[1]):
+                yield i, j, self.chunk_window(i, j), self.read_chunk(i, j)
+
+    def __getitem__(self, key) -> np.ndarray:
+        rows, cols, bands = _normalize_key(key)
+
+        r_span, r_idx, r_drop = _axis_selection(rows, self.shape[0])
+        c_span, c_idx, c_drop = _axis_selection(cols, self.shape[1])
+
+        if isinstance(bands, (int, np.integer)):
+            bands, b_drop = [_check_index(bands, self.shape[2])], True
+        elif isinstance(bands, slice):
+            b_drop = False
+        else:
+            bands, b_drop = [_check_index(b, self.shape[2]) for b in bands], False
+
+        if r_span is None or c_span is None:
+            n_bands = len(range(*bands.indices(self.shape[2]))) if isinstance(bands, slice) else len(bands)
+            data = np.empty((_selection_length(r_span, r_idx), _selection_length(c_span, c_idx), n_bands), dtype=self.dtype)
+        else:
+            rows = np.arange(*r_span) if r_idx is None else r_span[0] + r_idx
+            cols = np.arange(*c_span) if c_idx is None else c_span[0] + c_idx
+            data = self._read_selection(rows, cols, bands)
+
+        if b_drop: data = data[:, :, 0]
+        if c_drop: data = data[:, 0, ...]
+        if r_drop: data = data[0, ...]
+
+        return data
+
+    def _read_selection(self, rows : np.ndarray, cols : np.ndarray, bands) -> np.ndarray:
+        '''
+            Assemble the [rows, cols, bands] selection from the chunks holding at least one of its pixels
+        '''
+        bands = list(range(*bands.indices(self.shape[2]))) if isinstance(bands, slice) else list(bands)
+        out = np.empty((len(rows), len(cols), len(bands)), dtype=self.dtype)
+
+        # Only the band chunks holding the requested bands are read
+        band_chunks = {}
+        for n, b in enumerate(bands):
+            band_chunks.setdefault(b // self.chunks[2], []).append(n)
+
+        for i, r_out, r_in in _chunk_selection(rows, self.chunks[0]):
+            for j, c_out, c_in in _chunk_selection(cols, self.chunks[1]):
+                for k, positions in band_chunks.items():
+                    chunk = self.read_chunk(i, j, k)
+                    local = [bands[n] - k * self.chunks[2] for n in positions]
+                    if isinstance(r_out, slice) and isinstance(c_out, slice):
+                        out[r_out, c_out, positions] = chunk[r_in, c_in, local]
+                    else:
+                        out[np.ix_(_as_indices(r_out), _as_indices(c_out), positions)] = \
+                            chunk[np.ix_(_as_indices(r_in), _as_indices(c_in), local)]
+
+        return out
+
+
+def _chunk_selection(indices : np.ndarray, chunk : int) -> list:
+    '''
+        Group the indices selected along an axis by chunk: (chunk index, positions in the selection,
+        positions in the chunk), as slices when both are contiguous and increasing
+    '''
+    groups = []
+    ids = indices // chunk
+    for c in np.unique(ids):
+        positions = np.nonzero(ids == c)[0]
+        local = indices[positions] - c * chunk
+        if positions[-1] - positions[0] + 1 == len(positions) and local[-1] - local[0] + 1 == len(local) and np.all(np.diff(local) == 1):
+            groups.append((int(c), slice(int(positions[0]), int(positions[-1]) + 1), slice(int(local[0]), int(local[-1]) + 1)))
+        else:
+            groups.append((int(c), positions, local))
+    return groups
+
+
+def _as_indices(selection) -> np.ndarray:
+    if isinstance(selection, slice):
+        return np.arange(selection.start, selection.stop)
+    return selection
+
+
+def _encode_profile(profile : dict) -> dict:
+    '''
+        Convert a rasterio profile to a JSON serializable dictionary
+    '''
+    if profile is None:
+        return None
+
+    encoded = {}
+    for key, value in dict(profile).items():
+        if key == 'crs' and value is not None:
+            value = CRS.from_user_input(value).to_wkt()
+        elif key == 'transform' and value is not None:
+            value = list(value)[:6]
+        elif isinstance(value, np.generic):
+            value = value.item()
+        encoded[key] = value
+    return encoded
+
+
+def _decode_profile(encoded : dict) -> dict:
+    '''
+        Convert a dictionary produced by _encode_profile back to a rasterio profile
+    '''
+    if encoded is None:
+        return None
+
+    profile = dict(encoded)
+    if profile.get('crs') is not None:
+        profile['crs'] = CRS.from_wkt(profile['crs'])
+    if profile.get('transform') is not None:
+        profile['transform'] = Affine(*profile['transform'])
+    return profile
+
+
+def _atomic_write_text(path : str, text : str) -> None:
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _compress(raw : bytes, compression : dict, itemsize : int) -> bytes:
+    '''
+        Compress the bytes of a chunk, shuffling the bytes of its values first if requested
+    '''
+    if compression['shuffle'] and itemsize > 1:
+        raw = np.frombuffer(raw, dtype=np.uint8).reshape(-1, itemsize).T.tobytes()
+
+    level = compression['level']
+    if compression['id'] == 'zlib':
+        return zlib.compress(raw, level if level is not None else 6)
+    if compression['id'] == 'lzma':
+        return lzma.compress(raw, preset=level)
+    return bz2.compress(raw, level if level is not None else 9)
+
+
+def _decompress(data : bytes, compression : dict, itemsize : int) -> bytes:
+    if compression['id'] == 'zlib':
+        raw = zlib.decompress(data)
+    elif compression['id'] == 'lzma':
+        raw = lzma.decompress(data)
+    else:
+        raw = bz2.decompress(data)
+
+    if compression['shuffle'] and itemsize > 1:
+        raw = np.frombuffer(raw, dtype=np.uint8).reshape(itemsize, -1).T.tobytes()
+    return raw
@@ -0,0 +1,272 @@
+from .raster import _read_into, _band_indexes
+
+from rasterio.coords import BoundingBox
+from rasterio.dtypes import in_dtype_range
+from rasterio.enums import MaskFlags
+from rasterio.windows import Window
+from rasterio import windows
+from affine import Affine
+import numpy as np
+import rasterio
+import math
+
+
+class Mosaic:
+    '''
+        Virtual mosaic of rasters sharing a common grid (same CRS, pixel size and pixel alignment,
+        e.g. adjacent granules of a tiling grid).
+
+        No pixel is read when the mosaic is created, only the file headers. A window (or bbox) read
+        fetches, from each file intersecting it, only the intersecting part, so a patch crossing
+        granule borders costs just the bytes it covers.
+
+        Overlaps are resolved by priority: with priority='first' earlier files in paths win, with
+        priority='last' later files win. Pixels that are not valid in a file (its nodata value, alpha
+        band or internal mask) are taken from the next file in priority order; files whose part of
+        the window is already fully covered by valid pixels of higher priority files are not read.
+        Pixels not covered by any valid pixel are set to nodata. Nodata values are checked on the
+        pixels already read (a pixel is invalid where all the read bands are nodata), only alpha bands
+        and internal masks are read separately.
+
+        Parameters:
+        -----------
+            - paths : list
+                positions of the rasters, with the same CRS, pixel size, band count and grid alignment
+            - priority : str
+                'first' or 'last', which file wins where files overlap (default : 'first')
+            - nodata : float
+                value of the pixels not covered by any file, if None the nodata of the first file, or 0 (default : None)
+
+        Attributes:
+        -----------
+            - shape : tuple
+                (H, W, B) shape of the mosaic
+            - dtype : np.dtype
+                data type of the mosaic
+            - transform : Affine
+                affine transform of the mosaic grid
+            - crs : CRS
+                coordinate reference system of the mosaic
+            - bounds : BoundingBox
+                geo bounds of the mosaic (union of the bounds of the files)
+            - profile : dict
+                rasterio profile describing the full mosaic
+
+        Usage:
+        ------
+        ```python
+        with Mosaic(['path/to/T32TPR.tif', 'path/to/T32TQR.tif']) as mosaic:
+            patch = mosaic.read(Window(10900, 5000, 256, 256))
+            aoi   = mosaic.read_bounds((699000, 5070000, 712000, 5081000), bands=[3, 2, 1])
+        ```
+
+        Output:
+        -------
+        ```
+        patch.shape, aoi.shape
+        ((256, 256, 13), (1100, 1300, 3))
+        ```
+    '''
+
+    def __init__(self, paths : list, priority : str = 'first', nodata : float = None) -> None:
+        if len(paths) == 0:
+            raise Exception('Error: paths must not be empty')
+        if priority not in ('first', 'last'):
+            raise Exception("Error: priority must be 'first' or 'last'")
+
+        self.paths = list(paths)
+        self.priority = priority
+        self._handles = {}
+
+        headers = []
+        for path in self.paths:
+            with rasterio.open(path) as src:
+                headers.append((src.profile, src.bounds, src.res))
+
+        profile, _, res = headers[0]
+        for path, (p, _, r) in zip(self.paths, headers):
+            if p['crs'] != profile['crs']:
+                raise Exception('Error: {} has a different CRS'.format(path))
+            if not np.allclose(r, res, rtol=0, atol=1e-9 * max(res)):
+                raise Exception('Error: {} has a different pixel size'.format(path))
+            if p['count'] != profile['count']:
+                raise Exception('Error: {} has a different number of bands'.format(path))
+
+        left   = min(b.left for _, b, _ in headers)
+        top    = max(b.top for _, b, _ in headers)
+        right  = max(b.right for _, b, _ in headers)
+        bottom = min(b.bottom for _, b, _ in headers)
+
+        self.transform = Affine(res[0], 0.0, left, 0.0, -res[1], top)
+        self.crs = profile['crs']
+        self.dtype = np.result_type(*[p['dtype'] for p, _, _ in headers])
+        self.nodata = nodata if nodata is not None else (profile['nodata'] if profile['nodata'] is not None else 0)
+
+        # Pixel offset of each file in the mosaic grid
+        self._offsets = []
+        for path, (p, b, _) in zip(self.paths, headers):
+            col, row = (b.left - left) / res[0], (top - b.top) / res[1]
+            if abs(col - round(col)) > 1e-6 or abs(row - round(row)) > 1e-6:
+                raise Exception('Error: {} is not aligned to the grid of the mosaic'.format(path))
+            self._offsets.append((int(round(row)), int(round(col)), p['height'], p['width']))
+
+        height = int(round((top - bottom) / res[1]))
+        width = int(round((right - left) / res[0]))
+        self.shape = (height, width, profile['count'])
+        self.bounds = BoundingBox(left, top - height * res[1], left + width * res[0], top)
+
+        self.profile = profile.copy()
+        for key in ['blockxsize', 'blockysize', 'tiled', 'compress', 'interleave', 'photometric']:
+            self.profile.pop(key, None)
+        self.profile.update(driver='GTiff', width=width, height=height, dtype=self.dtype.name,
+                            transform=self.transform, nodata=self.nodata)
+
+    def close(self) -> None:
+        '''
+            Close the files opened by the reads
+        '''
+        for src in self._handles.values():
+            src.close()
+        self._handles = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __repr__(self) -> str:
+        return '<Mosaic of {} files shape={} dtype={}>'.format(len(self.paths), self.shape, self.dtype)
+
+    def read(self, window : Window = None, bands : list = None, out : np.ndarray = None, dtype : str = None) -> np.ndarray:
+        '''
+            Read a window of the mosaic
+
+            Parameters:
+            -----------
+                - window : rasterio.windows.Window
+                    integer window in the mosaic grid, may extend beyond the mosaic, if None the full mosaic is read (default : None)
+                - bands : list
+                    list of 0-based band indices to be read, if None all the bands are read (default : None)
+                - out : np.ndarray
+                    preallocated HxWxB buffer to be filled, its dtype is the output dtype (default : None)
+                - dtype : str
+                    output dtype when out is None, if None the mosaic dtype is used (default : None)
+
+            Returns:
+            --------
+                - data : np.ndarray
+                    HxWxB data, with H height, W width and B bands (out, if given)
+
+            Usage:
+            ------
+            ```python
+            patch = mosaic.read(Window(10900, 5000, 256, 256), bands=[3, 2, 1])
+            ```
+        '''
+        if window is None:
+            window = Window(0, 0, self.shape[1], self.shape[0])
+        row_off, col_off = int(round(window.row_off)), int(round(window.col_off))
+        height, width = int(round(window.height)), int(round(window.width))
+        indexes = _band_indexes(bands, self.shape[2])
+
+        if out is None:
+            out = np.empty((height, width, len(indexes)), dtype=dtype if dtype is not None else self.dtype)
+        elif out.shape != (height, width, len(indexes)):
+            raise Exception('Error: out must have shape {}'.format((height, width, len(indexes))))
+
+        out[...] = self.nodata
+        filled = np.zeros((height, width), dtype=bool)
+
+        order = range(len(self.paths)) if self.priority == 'first' else range(len(self.paths) - 1, -1, -1)
+        for f in order:
+            r, c, h, w = self._offsets[f]
+            r0, r1 = max(row_off, r), min(row_off + height, r + h)
+            c0, c1 = max(col_off, c), min(col_off + width, c + w)
+            if r0 >= r1 or c0 >= c1:
+                continue
+
+            target = (slice(r0 - row_off, r1 - row_off), slice(c0 - col_off, c1 - col_off))
+            if filled[target].all():
+                continue
+
+            src = self._open(f)
+            piece = Window(c0 - c, r0 - r, c1 - c0, r1 - r0)
+            data = _read_into(src, np.empty((r1 - r0, c1 - c0, len(indexes)), dtype=out.dtype), indexes, piece)
+
+            if src.nodata is None and all(flags == [MaskFlags.all_valid] for flags in src.mask_flag_enums):
+                valid = ~filled[target]
+            elif _nodata_only(src, out.dtype):
+                # Validity from the pixels already read: invalid where all the read bands are nodata
+                invalid = np.isnan(data).all(axis=-1) if np.isnan(src.nodata) else (data == src.nodata).all(axis=-1)
+                valid = ~filled[target] & ~invalid
+            else:
+                # Alpha band or internal mask
+                valid = ~filled[target] & (src.dataset_mask(window=piece) > 0)
+
+            np.copyto(out[target], data, where=valid[..., np.newaxis])
+            filled[target] |= valid
+
+            if filled.all():
+                break
+
+        return out
+
+    def read_bounds(self, bbox : tuple, bands : list = None, out : np.ndarray = None, dtype : str = None) -> np.ndarray:
+        '''
+            Read the pixels of the mosaic covering a bounding box
+
+            Parameters:
+            -----------
+                - bbox : tuple
+                    (left, bottom, right, top) bounding box in the CRS of the mosaic
+                - bands : list
+                    list of 0-based band indices to be read, if None all the bands are read (default : None)
+                - out : np.ndarray
+                    preallocated HxWxB buffer to be filled (default : None)
+                - dtype : str
+                    output dtype when out is None, if None the mosaic dtype is used (default : None)
+
+            Returns:
+            --------
+                - data : np.ndarray
+                    HxWxB data of the pixels intersecting bbox, with H height, W width and B bands
+
+            Usage:
+            ------
+            ```python
+            aoi = mosaic.read_bounds((699000, 5070000, 712000, 5081000))
+            ```
+        '''
+        return self.read(self.window(bbox), bands=bands, out=out, dtype=dtype)
+
+    def window(self, bbox : tuple) -> Window:
+        '''
+            Integer window of the mosaic grid covering a (left, bottom, right, top) bounding box
+        '''
+        w = windows.from_bounds(*bbox, transform=self.transform)
+        row_off, col_off = math.floor(w.row_off + 1e-6), math.floor(w.col_off + 1e-6)
+        row_stop, col_stop = math.ceil(w.row_off + w.height - 1e-6), math.ceil(w.col_off + w.width - 1e-6)
+        return Window(col_off, row_off, col_stop - col_off, row_stop - row_off)
+
+    def _open(self, f : int) -> rasterio.io.DatasetReader:
+        src = self._handles.get(f)
+        if src is None:
+            src = rasterio.open(self.paths[f])
+            self._handles[f] = src
+        return src
+
+
+def _nodata_only(src : rasterio.io.DatasetReader, dtype : np.dtype) -> bool:
+    '''
+        True if the validity of src is given by its nodata value only, and that value is preserved
+        when reading in dtype
+    '''
+    if src.nodata is None or not all(flags == [MaskFlags.nodata] for flags in src.mask_flag_enums):
+        return False
+    if np.isnan(src.nodata):
+        return np.dtype(dtype).kind == 'f'
+    return in_dtype_range(src.nodata, np.dtype(dtype).name) and np.dtype(dtype).type(src.nodata) == src.nodata
@@ -0,0 +1,195 @@
+from .._lazy import lazy_import
+
+import numpy as np
+
+netCDF4 = lazy_import('netCDF4')
+
+
+TIME_DIMENSIONS = ['time', 't', 'Time', 'TIME']
+
+
+def load_netcdf(path : str, variables : list = None, time : slice = None, rows : slice = None, cols : slice = None,
+                time_dimension : str = None) -> np.ndarray:
+    '''
+        Read variables of a NetCDF file into a channel-last array.
+
+        Every selected variable must have (time, y, x) or (y, x) dimensions, variables become the
+        channels of the output array. Only the requested time and space slices are read.
+
+        Parameters:
+        -----------
+            - path : str
+                position of the NetCDF file
+            - variables : list
+                names of the variables to be read, if None all the variables with the same dimensions
+                as the first non-coordinate variable are read (default : None)
+            - time : slice
+                slice of the time dimension to be read, if None all the time steps are read (default : None)
+            - rows : slice
+                slice of the y dimension to be read, if None all the rows are read (default : None)
+            - cols : slice
+                slice of the x dimension to be read, if None all the columns are read (default : None)
+            - time_dimension : str
+                name of the time dimension (e.g. 'valid_time'), if None the first dimension of 3D variables
+                must be unlimited or one of TIME_DIMENSIONS (default : None)
+
+        Returns:
+        --------
+            - data : np.ndarray
+                TxHxWxV array (HxWxV if the variables have no time dimension), with T time steps,
+                H height, W width and V variables
+
+        Usage:
+        ------
+        ```python
+        cube = load_netcdf('path/to/file.nc', variables=['t2m', 'tp'], time=slice(0, 365))
+        ```
+
+        Output:
+        -------
+        ```
+        cube.shape
+        (365, 721, 1440, 2)
+        ```
+    '''
+
+    with netCDF4.Dataset(path, 'r') as ds:
+        ds.set_auto_mask(False)
+        names, time_axis = _select_variables(ds, variables, time_dimension)
+        first = ds.variables[names[0]]
+
+        time = _to_slice(time)
+        key = (time,) if time_axis is not None else ()
+        key = key + (_to_slice(rows), _to_slice(cols))
+
+        shape = tuple(len(range(*k.indices(n))) for k, n in zip(key, first.shape))
+        data = np.empty(shape + (len(names),), dtype=np.result_type(*[ds.variables[n].dtype for n in names]))
+        for v, name in enumerate(names):
+            data[..., v] = ds.variables[name][key]
+
+    return data
+
+
+def iter_netcdf(path : str, variables : list = None, time : slice = None, rows : slice = None, cols : slice = None, step : int = None,
+                time_dimension : str = None):
+    '''
+        Stream variables of a NetCDF file over the time dimension.
+
+        Time steps are read in blocks aligned to the on-disk chunking of the time dimension, so
+        each chunk is decompressed once and memory is bounded by one block of time steps.
+
+        Parameters:
+        -----------
+            - path : str
+                position of the NetCDF file
+            - variables : list
+                names of the variables to be read, if None all the variables with the same dimensions
+                as the first non-coordinate variable are read (default : None)
+            - time : slice
+                slice of the time dimension to be streamed, step must be 1 or None (default : None)
+            - rows : slice
+                slice of the y dimension to be read, if None all the rows are read (default : None)
+            - cols : slice
+                slice of the x dimension to be read, if None all the columns are read (default : None)
+            - step : int
+                number of time steps per block, if None the time chunk size of the file is used (default : None)
+            - time_dimension : str
+                name of the time dimension (e.g. 'valid_time'), if None the first dimension of 3D variables
+                must be unlimited or one of TIME_DIMENSIONS (default : None)
+
+        Returns:
+        --------
+            - (times, data) : tuple
+                range of the time indices in the block and the txHxWxV block, with t time steps,
+                H height, W width and V variables
+
+        Usage:
+        ------
+        ```python
+        for times, block in iter_netcdf('path/to/file.nc', variables=['t2m', 'tp']):
+            process(block)
+        ```
+
+        Output:
+        -------
+        ```
+        times, block.shape
+        range(0, 24), (24, 721, 1440, 2)
+        ```
+    '''
+
+    with netCDF4.Dataset(path, 'r') as ds:
+        ds.set_auto_mask(False)
+        names, time_axis = _select_variables(ds, variables, time_dimension)
+        if time_axis is None:
+            raise Exception('Error: variables {} have no time dimension'.format(names))
+
+        first = ds.variables[names[0]]
+        n_times = first.shape[0]
+        chunk = first.chunking()
+        # 'contiguous' for uncompressed NETCDF4 variables, None for classic (NETCDF3) files
+        chunk = chunk[0] if isinstance(chunk, (list, tuple)) else 1
+        if step is None: step = chunk
+
+        start, stop, stride = _to_slice(time).indices(n_times)
+        if stride != 1:
+            raise Exception('Error: time slice step must be 1')
+
+        rows, cols = _to_slice(rows), _to_slice(cols)
+        dtype = np.result_type(*[ds.variables[n].dtype for n in names])
+
+        t0 = start
+        while t0 < stop:
+            # Blocks end on chunk boundaries, so no chunk is decompressed twice
+            t1 = ((t0 + step) // chunk) * chunk if step >= chunk else t0 + step
+            t1 = min(stop, t1)
+
+            key = (slice(t0, t1), rows, cols)
+            shape = (t1 - t0,) + tuple(len(range(*k.indices(n))) for k, n in zip(key[1:], first.shape[1:]))
+            data = np.empty(shape + (len(names),), dtype=dtype)
+            for v, name in enumerate(names):
+                data[..., v] = ds.variables[name][key]
+
+            yield range(t0, t1), data
+            t0 = t1
+
+
+def _select_variables(ds, variables : list, time_dimension : str = None) -> tuple:
+    '''
+        Validate the requested variables and find the position of their time dimension
+    '''
+    if variables is None:
+        candidates = [v for v in ds.variables.values() if v.ndim >= 2 and v.name not in ds.dimensions]
+        if len(candidates) == 0:
+            raise Exception('Error: no (time, y, x) or (y, x) variables found')
+        variables = [v.name for v in candidates if v.dimensions == candidates[0].dimensions]
+
+    for name in variables:
+        if name not in ds.variables:
+            raise Exception('Error: variable {} not found'.format(name))
+
+    dimensions = ds.variables[variables[0]].dimensions
+    if any(ds.variables[name].dimensions != dimensions for name in variables):
+        raise Exception('Error: all the variables must have the same dimensions')
+
+    if len(dimensions) == 3:
+        if time_dimension is not None:
+            if dimensions[0] != time_dimension:
+                raise Exception('Error: first dimension of 3D variables must be {}, got {}'.format(time_dimension, dimensions[0]))
+        elif dimensions[0] not in TIME_DIMENSIONS and not ds.dimensions[dimensions[0]].isunlimited():
+            raise Exception('Error: first dimension of 3D variables must be time, got {} (set time_dimension)'.format(dimensions[0]))
+        time_axis = 0
+    elif len(dimensions) == 2:
+        time_axis = None
+    else:
+        raise Exception('Error: variables must have (time, y, x) or (y, x) dimensions, got {}'.format(dimensions))
+
+    return list(variables), time_axis
+
+
+def _to_slice(s) -> slice:
+    if s is None:
+        return slice(None)
+    if isinstance(s, slice):
+        return s
+    return slice(*s)
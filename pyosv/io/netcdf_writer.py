@@ -0,0 +1,137 @@
+from .._lazy import lazy_import
+
+import numpy as np
+import os
+
+netCDF4 = lazy_import('netCDF4')
+
+
+def write_netcdf(path : str, data : np.ndarray, variables : list = None, time : list = None, time_units : str = None,
+                 meta : dict = None, chunks : tuple = None, zlib : bool = True, complevel : int = 4, shuffle : bool = True,
+                 append : bool = False) -> None:
+    '''
+        Write a channel-last cube to a chunked, compressed NetCDF file, or append time steps to it.
+
+        Channels become (time, y, x) variables (or (y, x) variables for HxWxV data), compressed chunk by
+        chunk with zlib and the shuffle filter. The time dimension is unlimited, so multi-date cubes can
+        be written incrementally with append=True, and its chunking is the one pyosv.io.netcdf_reader.iter_netcdf
+        streams over. If meta contains a transform (and a crs), x/y coordinates of the pixel centres
+        (and a CF grid mapping) are saved too; its nodata becomes the fill value of the variables.
+
+        Parameters:
+        -----------
+            - path : str
+                position of the NetCDF file
+            - data : np.ndarray
+                TxHxWxV cube (or HxWxV for variables without time), with T time steps, H height, W width and V variables
+            - variables : list
+                names of the V variables, if None 'var_0', 'var_1', ... (default : None)
+            - time : list
+                values of the time coordinate of the T time steps, if None their indices (default : None)
+            - time_units : str
+                units of the time coordinate, e.g. 'days since 2019-01-01' (default : None)
+            - meta : dict
+                rasterio profile of the image (e.g. from pyosv.io.reader.load), for coordinates and fill value (default : None)
+            - chunks : tuple
+                (t, y, x) chunk shape, if None (1, 256, 256) clipped to the data shape (default : None)
+            - zlib : bool
+                if True compress the variables with zlib (default : True)
+            - complevel : int
+                zlib compression level, 1 to 9 (default : 4)
+            - shuffle : bool
+                if True apply the shuffle filter before compression (default : True)
+            - append : bool
+                if True and the file exists, append the time steps to it (default : False)
+
+        Returns:
+        --------
+        Nothing, the file will be saved
+
+        Usage:
+        ------
+        ```python
+        write_netcdf('path/to/cube.nc', cube, variables=['ndvi', 'ndwi'], time=[0, 5, 10],
+                     time_units='days since 2019-06-01', meta=meta, chunks=(8, 256, 256))
+
+        # a new acquisition
+        write_netcdf('path/to/cube.nc', scene[np.newaxis], variables=['ndvi', 'ndwi'], time=[15], append=True)
+        ```
+    '''
+
+    if data.ndim not in (3, 4):
+        raise Exception('Error: data must be TxHxWxV or HxWxV, got shape {}'.format(data.shape))
+
+    has_time = data.ndim == 4
+    if variables is None:
+        variables = ['var_{}'.format(v) for v in range(data.shape[-1])]
+    if len(variables) != data.shape[-1]:
+        raise Exception('Error: {} variables given for {} channels'.format(len(variables), data.shape[-1]))
+    if time is not None and (not has_time or len(time) != data.shape[0]):
+        raise Exception('Error: time must have one value for each of the {} time steps'.format(data.shape[0] if has_time else 0))
+
+    if append and os.path.isfile(path):
+        if not has_time:
+            raise Exception('Error: only TxHxWxV data can be appended')
+        _append(path, data, variables, time)
+        return
+
+    meta = meta if meta is not None else {}
+    height, width = data.shape[-3], data.shape[-2]
+    if chunks is None:
+        chunks = (1, 256, 256)
+    chunks = (min(chunks[0], max(1, data.shape[0])) if has_time else 1, min(chunks[1], height), min(chunks[2], width))
+    fill_value = meta.get('nodata')
+
+    with netCDF4.Dataset(path, 'w') as ds:
+        ds.set_auto_mask(False)
+        ds.createDimension('y', height)
+        ds.createDimension('x', width)
+        dimensions = ('y', 'x')
+
+        if has_time:
+            ds.createDimension('time', None)
+            t = ds.createVariable('time', 'f8' if time is None or np.asarray(time).dtype.kind == 'f' else np.asarray(time).dtype, ('time',))
+            if time_units is not None:
+                t.units = time_units
+            t[:] = np.arange(data.shape[0]) if time is None else np.asarray(time)
+            dimensions = ('time',) + dimensions
+
+        if meta.get('transform') is not None:
+            transform = meta['transform']
+            ds.createVariable('y', 'f8', ('y',))[:] = transform.f + transform.e * (np.arange(height) + 0.5)
+            ds.createVariable('x', 'f8', ('x',))[:] = transform.c + transform.a * (np.arange(width) + 0.5)
+
+        grid_mapping = None
+        if meta.get('crs') is not None:
+            grid_mapping = ds.createVariable('spatial_ref', 'i4')
+            grid_mapping.crs_wkt = meta['crs'].to_wkt() if hasattr(meta['crs'], 'to_wkt') else str(meta['crs'])
+            if meta.get('transform') is not None:
+                grid_mapping.GeoTransform = ' '.join(str(v) for v in meta['transform'].to_gdal())
+
+        for v, name in enumerate(variables):
+            var = ds.createVariable(name, data.dtype, dimensions, zlib=zlib, complevel=complevel, shuffle=shuffle,
+                                    chunksizes=chunks if has_time else chunks[1:], fill_value=fill_value)
+            if grid_mapping is not None:
+                var.grid_mapping = 'spatial_ref'
+            var[...] = data[..., v]
+
+
+def _append(path : str, data : np.ndarray, variables : list, time : list) -> None:
+    '''
+        Append the TxHxWxV data along the time dimension of an existing file
+    '''
+    with netCDF4.Dataset(path, 'a') as ds:
+        ds.set_auto_mask(False)
+        for name in variables:
+            if name not in ds.variables:
+                raise Exception('Error: variable {} not found in {}'.format(name, path))
+            if ds.variables[name].ndim != 3 or ds.variables[name].shape[1:] != data.shape[1:3]:
+                raise Exception('Error: variable {} has shape {}, can not append {} time steps of {}'.format(
+                    name, ds.variables[name].shape, data.shape[0], data.shape[1:3]))
+
+        start = ds.variables[variables[0]].shape[0]
+        stop = start + data.shape[0]
+        if 'time' in ds.variables:
+            ds.variables['time'][start:stop] = np.arange(start, stop) if time is None else np.asarray(time)
+        for v, name in enumerate(variables):
+            ds.variables[name][start:stop] = data[..., v]
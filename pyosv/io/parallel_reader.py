@@ -0,0 +1,105 @@
+from .reader import load
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import rasterio
+import os
+
+
+def load_many(paths : list, max_workers : int = 4, max_bytes : int = None, ordered : bool = True, **kwargs):
+    '''
+        Load many images concurrently on a thread pool.
+
+        Files are read with pyosv.io.reader.load, rasterio (GDAL) releases the GIL while reading
+        and decoding, so I/O bound ingestion runs on several cores. The number of files read but
+        not yet consumed is bounded both in count (2 x max_workers) and, optionally, in bytes.
+
+        Parameters:
+        -----------
+            - paths : list
+                positions of the images
+            - max_workers : int
+                number of reading threads (default : 4)
+            - max_bytes : int
+                maximum (estimated) size in bytes of the images being read or waiting to be consumed,
+                a single image larger than max_bytes is still read, alone (default : None, no limit)
+            - ordered : bool
+                if True results are yielded in input order, otherwise as soon as they are read (default : True)
+            - kwargs : dict
+                further arguments passed to pyosv.io.reader.load (e.g. bands, resolution)
+
+        Returns:
+        --------
+            - (index, (data, metadata, bounds)) : tuple
+                position of the image in paths and the output of pyosv.io.reader.load
+
+        Usage:
+        ------
+        ```python
+        for i, (img, meta, bounds) in load_many(paths, max_workers=8, max_bytes=4*2**30):
+            process(img)
+        ```
+    '''
+
+    if max_workers < 1:
+        raise Exception('Error: max_workers must be grather than 0')
+
+    paths = list(paths)
+    max_in_flight = 2 * max_workers
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = {}
+    in_flight_bytes = 0
+    next_submit = 0
+    next_yield = 0
+
+    try:
+        while next_yield < len(paths):
+
+            # Submit as many reads as the count and byte budgets allow
+            while next_submit < len(paths) and len(pending) < max_in_flight:
+                size = _estimate_bytes(paths[next_submit], kwargs) if max_bytes is not None else 0
+                if max_bytes is not None and len(pending) > 0 and in_flight_bytes + size > max_bytes:
+                    break
+                future = executor.submit(load, paths[next_submit], **kwargs)
+                pending[future] = (next_submit, size)
+                in_flight_bytes += size
+                next_submit += 1
+
+            if ordered:
+                future = [f for f, (i, _) in pending.items() if i == next_yield][0]
+                future.result()
+            else:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                future = done.pop()
+
+            i, size = pending.pop(future)
+            in_flight_bytes -= size
+            next_yield += 1
+
+            yield i, future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def _estimate_bytes(path : str, kwargs : dict) -> int:
+    '''
+        Estimate the size in memory of the data returned by pyosv.io.reader.load without reading pixels
+    '''
+    try:
+        if path.endswith('.npy'):
+            data = np.load(path, mmap_mode='r')
+            return data.nbytes
+
+        with rasterio.open(path) as src:
+            count = len(kwargs['bands']) if kwargs.get('bands') is not None else src.count
+            size = src.width * src.height * count * np.dtype(src.dtypes[0]).itemsize
+            if kwargs.get('resolution') is not None:
+                resolution = kwargs['resolution']
+                if np.isscalar(resolution): resolution = (resolution, resolution)
+                size = int(size * (src.res[0] / resolution[0]) * (src.res[1] / resolution[1]))
+            return size
+    except Exception:
+        return os.path.getsize(path) if os.path.isfile(path) else 0
@@ -0,0 +1,79 @@
+from .writer import write
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+
+def write_many(items, max_workers : int = 4, max_in_flight : int = None, processes : bool = False, num_threads : int = 1, **kwargs) -> list:
+    '''
+        Write many images concurrently on a thread or process pool.
+
+        Each item is saved with pyosv.io.writer.write. items is consumed lazily (it can be a generator
+        producing the images), and at most max_in_flight images are waiting to be written or being
+        written at the same time, so memory stays bounded whatever the number of outputs.
+
+        Threads are usually enough for GeoTIFF outputs, GDAL releases the GIL while compressing; processes
+        avoid the GIL for the other formats, at the cost of copying every image to a worker process.
+        Each write compresses its blocks with num_threads GDAL threads: keep max_workers x num_threads
+        close to the number of cores.
+
+        Parameters:
+        -----------
+            - items : iterable
+                (image, path, meta) tuples, meta can be None
+            - max_workers : int
+                number of concurrent writes (default : 4)
+            - max_in_flight : int
+                maximum number of images submitted and not yet written, if None 2 x max_workers (default : None)
+            - processes : bool
+                if True write on a process pool instead of a thread pool (default : False)
+            - num_threads : int
+                GDAL compression threads of each write (default : 1)
+            - kwargs : dict
+                further arguments passed to pyosv.io.writer.write (e.g. cog, dtype, scale)
+
+        Returns:
+        --------
+            - paths : list
+                positions of the written images, in input order
+
+        Usage:
+        ------
+        ```python
+        outputs = ((predict(img), path.replace('.tif', '_pred.tif'), meta) for img, meta, path in inputs)
+        write_many(outputs, max_workers=8, cog=True)
+        ```
+    '''
+
+    if max_workers < 1:
+        raise Exception('Error: max_workers must be grather than 0')
+    if max_in_flight is None:
+        max_in_flight = 2 * max_workers
+    if max_in_flight < 1:
+        raise Exception('Error: max_in_flight must be grather than 0')
+
+    executor = (ProcessPoolExecutor if processes else ThreadPoolExecutor)(max_workers=max_workers)
+    pending = set()
+    paths = []
+
+    try:
+        for image, path, meta in items:
+            # Wait for a slot before taking the next image from items
+            while len(pending) >= max_in_flight:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    future.result()
+
+            future = executor.submit(write, image, path, meta, num_threads=num_threads, **kwargs)
+            pending.add(future)
+            paths.append(path)
+
+        for future in list(pending):
+            future.result()
+            pending.discard(future)
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+    return paths
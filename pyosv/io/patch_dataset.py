@@ -0,0 +1,249 @@
+from .batch_reader import _offsets
+from .raster import _read_into
+
+from concurrent.futures import ThreadPoolExecutor
+from rasterio.windows import Window
+from rasterio import windows
+from collections import OrderedDict
+import numpy as np
+import rasterio
+import json
+import os
+
+
+class PatchDataset:
+    '''
+        Random-access dataset of the patches of many rasters, for training.
+
+        A compact index of every valid (file, window) pair, i.e. every patch fully inside its file, is
+        built once from the file headers and can be persisted to a .npz file, that is reused as long as
+        the files, patch shape and stride do not change. Indexing is O(1); each patch is read with a
+        windowed read on an open handle kept in a small per-process LRU cache, so the dataset can be
+        used from several worker processes (handles are never shared across a fork).
+
+        Parameters:
+        -----------
+            - paths : list
+                positions of the rasters
+            - patch_shape : tuple[int,int]
+                tuple of two integers representing the size of the patches (default : (64, 64))
+            - stride : tuple[int,int]
+                tuple of two integers representing the step between patches, if None it is patch_shape (default : None)
+            - index_path : str
+                position of the .npz file where the index is persisted, if None it is kept in memory (default : None)
+            - dtype : str
+                dtype of the patches, if None the dtype of each file is used (default : None)
+            - max_open : int
+                maximum number of files kept open by each process (default : 64)
+
+        Usage:
+        ------
+        ```python
+        dataset = PatchDataset(paths, patch_shape=(256, 256), index_path='path/to/index.npz', dtype='float32')
+
+        # in each of the num_workers worker processes
+        shard = dataset.shuffle(seed=epoch).shard(num_workers, worker_id)
+        for i in range(len(shard)):
+            patch = shard[i]
+        ```
+
+        Output:
+        -------
+        ```
+        len(dataset), dataset[0].shape
+        (1250000, (256, 256, 13))
+        ```
+    '''
+
+    def __init__(self, paths : list, patch_shape : tuple = (64,64), stride : tuple = None, index_path : str = None,
+                 dtype : str = None, max_open : int = 64) -> None:
+        self.paths = [os.path.abspath(p) for p in paths]
+        self.patch_shape = tuple(patch_shape)
+        self.stride = tuple(stride) if stride is not None else self.patch_shape
+        self.dtype = dtype
+        self.max_open = max_open
+
+        key = _index_key(self.paths, self.patch_shape, self.stride)
+        index = _load_index(index_path, key) if index_path is not None else None
+        if index is None:
+            index = _build_index(self.paths, self.patch_shape, self.stride)
+            if index_path is not None:
+                _save_index(index_path, key, index)
+
+        self.file_ids, self.rows, self.cols = index
+        self._positions = np.arange(len(self.file_ids), dtype=np.int64)
+        self._handles = OrderedDict()
+        self._pid = os.getpid()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __getitem__(self, i : int) -> np.ndarray:
+        path, window = self.window(i)
+        src = self._open(path)
+        data = np.empty((self.patch_shape[0], self.patch_shape[1], src.count), dtype=self.dtype if self.dtype is not None else src.dtypes[0])
+        return _read_into(src, data, list(range(1, src.count + 1)), window)
+
+    def window(self, i : int) -> tuple:
+        '''
+            Position of the file and window of patch i
+
+            Returns:
+            --------
+                - (path, window) : tuple
+                    position of the raster and rasterio window of the patch
+        '''
+        p = self._positions[i]
+        return self.paths[self.file_ids[p]], Window(int(self.cols[p]), int(self.rows[p]), self.patch_shape[1], self.patch_shape[0])
+
+    def transform(self, i : int):
+        '''
+            Affine transform of patch i
+        '''
+        path, window = self.window(i)
+        return windows.transform(window, self._open(path).transform)
+
+    def shuffle(self, seed : int = None):
+        '''
+            Return a view of the dataset with the patches in a random order
+
+            Parameters:
+            -----------
+                - seed : int
+                    seed of the random permutation, the same seed gives the same order in every process (default : None)
+
+            Returns:
+            --------
+                - dataset : PatchDataset
+                    shuffled view of the dataset, sharing the index
+
+            Usage:
+            ------
+            ```python
+            shuffled = dataset.shuffle(seed=epoch)
+            ```
+        '''
+        view = self._view()
+        view._positions = self._positions[np.random.default_rng(seed).permutation(len(self._positions))]
+        return view
+
+    def shard(self, num_shards : int, shard_id : int):
+        '''
+            Return the shard_id-th of num_shards disjoint, interleaved, subsets of the dataset
+
+            Parameters:
+            -----------
+                - num_shards : int
+                    number of shards (e.g. number of worker processes)
+                - shard_id : int
+                    index of the shard, between 0 and num_shards - 1
+
+            Returns:
+            --------
+                - dataset : PatchDataset
+                    view of the dataset containing only the patches of the shard
+
+            Usage:
+            ------
+            ```python
+            shard = dataset.shard(num_workers, worker_id)
+            ```
+        '''
+        if num_shards < 1 or shard_id < 0 or shard_id >= num_shards:
+            raise Exception('Error: shard_id must be between 0 and num_shards - 1')
+
+        view = self._view()
+        view._positions = self._positions[shard_id::num_shards]
+        return view
+
+    def close(self) -> None:
+        '''
+            Close the files opened by this process
+        '''
+        if os.getpid() == self._pid:
+            for src in self._handles.values():
+                src.close()
+        self._handles = OrderedDict()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state['_handles'] = OrderedDict()
+        return state
+
+    def _view(self):
+        view = object.__new__(PatchDataset)
+        view.__dict__.update(self.__getstate__())
+        view._pid = os.getpid()
+        return view
+
+    def _open(self, path : str) -> rasterio.io.DatasetReader:
+        '''
+            Open handle on path from the per-process LRU cache of handles
+        '''
+        if os.getpid() != self._pid:
+            # Handles inherited through a fork must not be used (nor closed) by the child
+            self._handles = OrderedDict()
+            self._pid = os.getpid()
+
+        src = self._handles.get(path)
+        if src is None:
+            src = rasterio.open(path)
+            self._handles[path] = src
+            if len(self._handles) > self.max_open:
+                self._handles.popitem(last=False)[1].close()
+        else:
+            self._handles.move_to_end(path)
+        return src
+
+
+def _index_key(paths : list, patch_shape : tuple, stride : tuple) -> str:
+    '''
+        Description of what the index depends on, used to invalidate a persisted index
+    '''
+    files = []
+    for path in paths:
+        stat = os.stat(path)
+        files.append([path, stat.st_mtime_ns, stat.st_size])
+    return json.dumps({'files' : files, 'patch_shape' : list(patch_shape), 'stride' : list(stride)})
+
+
+def _build_index(paths : list, patch_shape : tuple, stride : tuple) -> tuple:
+    '''
+        Build the (file_ids, rows, cols) arrays of all the patches fully inside their file
+    '''
+    def shape(path):
+        with rasterio.open(path) as src:
+            return src.height, src.width
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        shapes = list(executor.map(shape, paths))
+
+    file_ids, rows, cols = [], [], []
+    for f, (height, width) in enumerate(shapes):
+        r, c = np.meshgrid(np.asarray(_offsets(height, patch_shape[0], stride[0], None), dtype=np.int32),
+                           np.asarray(_offsets(width, patch_shape[1], stride[1], None), dtype=np.int32), indexing='ij')
+        file_ids.append(np.full(r.size, f, dtype=np.int32))
+        rows.append(r.ravel())
+        cols.append(c.ravel())
+
+    if len(file_ids) == 0:
+        return np.empty(0, np.int32), np.empty(0, np.int32), np.empty(0, np.int32)
+    return np.concatenate(file_ids), np.concatenate(rows), np.concatenate(cols)
+
+
+def _save_index(index_path : str, key : str, index : tuple) -> None:
+    tmp = '{}.{}.tmp.npz'.format(index_path, os.getpid())
+    np.savez(tmp, key=np.array(key), file_ids=index[0], rows=index[1], cols=index[2])
+    os.replace(tmp, index_path)
+
+
+def _load_index(index_path : str, key : str) -> tuple:
+    '''
+        Load a persisted index, None if it does not exist or was built for other files/parameters
+    '''
+    if not os.path.isfile(index_path):
+        return None
+    with np.load(index_path) as index:
+        if str(index['key']) != key:
+            return None
+        return index['file_ids'], index['rows'], index['cols']
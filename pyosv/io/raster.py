@@ -0,0 +1,316 @@
+from .tile_cache import read_cached
+
+from rasterio.enums import Resampling
+from rasterio.windows import Window
+import numpy as np
+import rasterio
+
+
+class Raster:
+    '''
+        Lazy, window-addressable handle on a raster readable by rasterio.
+
+        Opening a Raster only reads the file header: shape, dtype, profile and bounds
+        are available immediately, while pixels are read on demand, only for the
+        window, bands and strides that are actually requested.
+
+        Slicing follows the channel-last convention used by pyosv, i.e. raster[rows, cols, bands],
+        with 0-based band indices. With a row step larger than 1 only the selected rows are read.
+
+        Parameters:
+        -----------
+            - path : str
+                position of the raster to open
+
+        Attributes:
+        -----------
+            - path : str
+                position of the raster
+            - shape : tuple
+                (H, W, B) shape of the full raster, with H height, W width and B bands
+            - dtype : np.dtype
+                data type of the raster
+            - profile : dict
+                rasterio profile of the raster
+            - bounds : BoundingBox
+                geo bounds of the raster
+            - transform : Affine
+                affine transform of the raster
+            - crs : CRS
+                coordinate reference system of the raster
+            - block_shapes : list
+                list of (rows, cols) internal block shapes, one for each band
+
+        Usage:
+        ------
+        ```python
+        with Raster('path/to/image.tif') as raster:
+            print(raster.shape, raster.dtype)
+            patch = raster[1024:1088, 2048:2112, :]
+            rgb   = raster[::16, ::16, [3, 2, 1]]
+            view  = raster.read(bands=[3, 2, 1], resolution=160)
+        ```
+
+        Output:
+        -------
+        ```
+        (10980, 10980, 13) uint16
+        ```
+    '''
+
+    def __init__(self, path : str) -> None:
+        self.path = path
+        self._src = rasterio.open(path)
+
+        self.profile      = self._src.profile
+        self.bounds       = self._src.bounds
+        self.transform    = self._src.transform
+        self.crs          = self._src.crs
+        self.block_shapes = self._src.block_shapes
+        self.dtype        = np.dtype(self._src.dtypes[0])
+        self.shape        = (self._src.height, self._src.width, self._src.count)
+
+    @property
+    def closed(self) -> bool:
+        '''
+            True if the underlying rasterio dataset has been closed
+        '''
+        return self._src.closed
+
+    @property
+    def overviews(self) -> list:
+        '''
+            Decimation factors of the internal overviews of the raster (empty if there are none)
+        '''
+        return self.dataset.overviews(1)
+
+    @property
+    def dataset(self) -> rasterio.io.DatasetReader:
+        '''
+            Underlying rasterio dataset
+        '''
+        if self._src.closed:
+            raise Exception('Error: raster {} has been closed'.format(self.path))
+        return self._src
+
+    def close(self) -> None:
+        '''
+            Close the underlying rasterio dataset
+        '''
+        self._src.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __repr__(self) -> str:
+        return '<Raster {} shape={} dtype={}>'.format(self.path, self.shape, self.dtype)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        data = self.read()
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        return data
+
+    def read(self, window : Window = None, bands : list = None, resolution : float or tuple = None, resampling : str = 'nearest',
+             out : np.ndarray = None, dtype : str = None) -> np.ndarray:
+        '''
+            Read a window of the raster, optionally for a subset of bands and at a coarser resolution.
+
+            When a resolution is given, the read is served from the internal overview that best
+            matches it, or by a decimated read if the raster has no overviews, so that only a
+            fraction of the bytes is read and decoded.
+
+            Data is read directly into a C-contiguous, channel-last (pixel-interleaved) buffer,
+            either the caller-provided out or a new one.
+
+            Parameters:
+            -----------
+                - window : rasterio.windows.Window
+                    window to be read, if None the full raster is read
+                - bands : list
+                    list of 0-based band indices to be read, if None all the bands are read
+                - resolution : float or tuple
+                    target pixel size (x, y) in CRS units, if None the native resolution is used
+                - resampling : str
+                    rasterio resampling method used when resolution is given (default : 'nearest')
+                - out : np.ndarray
+                    preallocated C-contiguous HxWxB buffer to be filled, its dtype is the output dtype (default : None)
+                - dtype : str
+                    output dtype when out is None, if None the raster dtype is used (default : None)
+
+            Returns:
+            --------
+                - data : np.ndarray
+                    HxWxB data, with H height, W width and B bands (out, if given)
+
+            Usage:
+            ------
+            ```python
+            raster = Raster('path/to/image.tif')
+            data   = raster.read(Window(0, 0, 256, 256), bands=[0, 1, 2])
+            rgb    = raster.read(bands=[3, 2, 1], resolution=160)
+
+            buffer = np.empty((256, 256, 13), dtype=np.float32)
+            raster.read(Window(0, 0, 256, 256), out=buffer)
+            ```
+        '''
+
+        indexes = _band_indexes(bands, self.shape[2])
+
+        height, width = _window_size(window, self.shape)
+        if resolution is not None:
+            height, width = _out_shape((height, width), self.dataset.res, resolution)
+
+        if out is None:
+            out = np.empty((height, width, len(indexes)), dtype=dtype if dtype is not None else self.dtype)
+        elif out.shape != (height, width, len(indexes)):
+            raise Exception('Error: out must have shape {}, got {}'.format((height, width, len(indexes)), out.shape))
+
+        return _read_into(self.dataset, out, indexes, window, Resampling[resampling])
+
+    def __getitem__(self, key) -> np.ndarray:
+        rows, cols, bands = _normalize_key(key)
+
+        r_span, r_idx, r_drop = _axis_selection(rows, self.shape[0])
+        c_span, c_idx, c_drop = _axis_selection(cols, self.shape[1])
+
+        if isinstance(bands, (int, np.integer)):
+            band_list, b_drop = [_check_index(bands, self.shape[2])], True
+        elif isinstance(bands, slice):
+            band_list, b_drop = list(range(*bands.indices(self.shape[2]))), False
+        else:
+            band_list, b_drop = [_check_index(b, self.shape[2]) for b in bands], False
+
+        if r_span is None or c_span is None or len(band_list) == 0:
+            shape = (_selection_length(r_span, r_idx), _selection_length(c_span, c_idx), len(band_list))
+            data = np.empty(shape, dtype=self.dtype)
+        elif r_idx is not None and len(r_idx) > 1 and abs(r_idx[1] - r_idx[0]) > 1:
+            # Strided rows: only the selected rows are read
+            data = np.empty((len(r_idx), c_span[1] - c_span[0], len(band_list)), dtype=self.dtype)
+            for k, row in enumerate(r_idx):
+                window = Window(c_span[0], r_span[0] + int(row), c_span[1] - c_span[0], 1)
+                self.read(window=window, bands=band_list, out=data[k:k + 1])
+            if c_idx is not None: data = data[:, c_idx, ...]
+        else:
+            window = Window(c_span[0], r_span[0], c_span[1] - c_span[0], r_span[1] - r_span[0])
+            data = self.read(window=window, bands=band_list)
+            # Reversed selections and column strides are applied on the (already reduced) window
+            if r_idx is not None: data = data[r_idx, ...]
+            if c_idx is not None: data = data[:, c_idx, ...]
+
+        if b_drop: data = data[:, :, 0]
+        if c_drop: data = data[:, 0, ...]
+        if r_drop: data = data[0, ...]
+
+        return data
+
+
+def _read_into(src : rasterio.io.DatasetReader, out : np.ndarray, indexes : list, window : Window = None,
+               resampling : Resampling = Resampling.nearest, **kwargs) -> np.ndarray:
+    '''
+        Read directly into a C-contiguous HxWxB buffer: rasterio is given a band-first strided view
+        of out, so GDAL writes pixel-interleaved data (converting dtype) without temporaries.
+        Native-resolution reads are served by the shared tile cache when it is enabled.
+    '''
+    if not out.flags['C_CONTIGUOUS']:
+        raise Exception('Error: out must be a C-contiguous array')
+
+    if len(kwargs) == 0 and read_cached(src, out, indexes, window):
+        return out
+
+    view = np.moveaxis(out, -1, 0)
+    data = src.read(indexes=indexes, window=window, out=view, resampling=resampling, **kwargs)
+    if not np.shares_memory(data, out):
+        view[...] = data
+    return out
+
+
+def _band_indexes(bands : list, count : int) -> list:
+    '''
+        Convert 0-based band indices to rasterio 1-based band indexes
+    '''
+    if bands is None:
+        return list(range(1, count + 1))
+    return [_check_index(b, count) + 1 for b in bands]
+
+
+def _window_size(window : Window, shape : tuple) -> tuple:
+    if window is None:
+        return shape[0], shape[1]
+    return int(round(window.height)), int(round(window.width))
+
+
+def _out_shape(size : tuple, native : tuple, resolution : float or tuple) -> tuple:
+    '''
+        Number of (rows, cols) needed to cover size pixels of native resolution at the target resolution
+    '''
+    if np.isscalar(resolution):
+        resolution = (resolution, resolution)
+
+    rows = max(1, int(np.ceil(size[0] * native[1] / resolution[1])))
+    cols = max(1, int(np.ceil(size[1] * native[0] / resolution[0])))
+    return rows, cols
+
+
+def _check_index(index : int, size : int) -> int:
+    index = int(index)
+    if index < 0: index += size
+    if index < 0 or index >= size:
+        raise Exception('Error: index {} is out of range for size {}'.format(index, size))
+    return index
+
+
+def _normalize_key(key) -> tuple:
+    '''
+        Expand a numpy-like key to a (rows, cols, bands) tuple
+    '''
+    if not isinstance(key, tuple):
+        key = (key,)
+
+    if any(k is Ellipsis for k in key):
+        if sum(k is Ellipsis for k in key) > 1:
+            raise Exception('Error: an index can only have a single ellipsis')
+        e = [i for i, k in enumerate(key) if k is Ellipsis][0]
+        key = key[:e] + (slice(None),) * (3 - len(key) + 1) + key[e + 1:]
+
+    if len(key) > 3:
+        raise Exception('Error: too many indices for a (rows, cols, bands) raster')
+
+    key = key + (slice(None),) * (3 - len(key))
+    return key
+
+
+def _axis_selection(key, size : int) -> tuple:
+    '''
+        Resolve the selection of a spatial axis into the contiguous span to be read,
+        the indices to be taken from that span (None if the whole span is used) and
+        whether the axis has to be dropped
+    '''
+    if isinstance(key, (int, np.integer)):
+        i = _check_index(key, size)
+        return (i, i + 1), None, True
+
+    if not isinstance(key, slice):
+        raise Exception('Error: spatial axes can only be indexed with integers or slices')
+
+    r = range(*key.indices(size))
+    if len(r) == 0:
+        return None, r, False
+
+    lo, hi = min(r), max(r) + 1
+    if r.step == 1:
+        return (lo, hi), None, False
+
+    return (lo, hi), np.asarray(r) - lo, False
+
+
+def _selection_length(span : tuple, idx) -> int:
+    if idx is not None:
+        return len(idx)
+    return span[1] - span[0]
@@ -0,0 +1,125 @@
+from rasterio.windows import Window
+import numpy as np
+import threading
+import rasterio
+
+
+class RasterWriter:
+    '''
+        Incremental, window by window, writer of a tiled GeoTIFF.
+
+        The file is created once from a profile (e.g. the metadata returned by pyosv.io.reader.load,
+        with width, height, count, dtype, crs and transform of the full image) and then filled with
+        windows or patches in any order, so results streamed with pyosv.io.batch_reader can be written
+        out without ever assembling the full image in memory.
+
+        Windows may extend beyond the image (e.g. patches read with padding), only their part inside
+        the image is written. Windows aligned to the internal blocks are written straight to disk,
+        partial blocks are completed in the GDAL block cache. Writes are serialized by a lock, so a
+        writer can be shared by worker threads.
+
+        Parameters:
+        -----------
+            - path : str
+                position of the GeoTIFF to be created
+            - profile : dict
+                rasterio profile of the full image, extra creation options (e.g. compress) are kept
+            - block_shape : tuple[int,int]
+                (rows, cols) internal tile shape, multiples of 16, if None the tiles of a tiled profile,
+                or (256, 256), are used (default : None)
+
+        Usage:
+        ------
+        ```python
+        _, meta, _ = load('path/to/image.tif', lazy=True)
+        meta.update(count=1, dtype='float32')
+
+        with RasterWriter('path/to/prediction.tif', meta) as writer:
+            for patch, window, transform in batch_reader.load('path/to/image.tif', (256, 256), padding='reflect', return_window=True):
+                writer.write(model(patch), window)
+        ```
+    '''
+
+    def __init__(self, path : str, profile : dict, block_shape : tuple = None) -> None:
+        profile = dict(profile)
+        if block_shape is None:
+            if profile.get('tiled') and 'blockysize' in profile and 'blockxsize' in profile:
+                block_shape = (profile['blockysize'], profile['blockxsize'])
+            else:
+                block_shape = (256, 256)
+
+        profile.update(driver='GTiff', tiled=True, blockysize=block_shape[0], blockxsize=block_shape[1])
+        profile.setdefault('interleave', 'pixel')
+        profile.setdefault('BIGTIFF', 'IF_SAFER')
+
+        self.path = path
+        self.profile = profile
+        self.shape = (profile['height'], profile['width'], profile['count'])
+        self.dtype = np.dtype(profile['dtype'])
+        self._dst = rasterio.open(path, 'w', **profile)
+        self._lock = threading.Lock()
+
+    @property
+    def closed(self) -> bool:
+        '''
+            True if the file has been closed
+        '''
+        return self._dst.closed
+
+    def write(self, data : np.ndarray, window : Window = None) -> None:
+        '''
+            Write a HxWxB (or HxW for single-band images) array at a window of the image
+
+            Parameters:
+            -----------
+                - data : np.ndarray
+                    HxWxB data, with H height, W width and B bands, cast to the dtype of the image
+                - window : rasterio.windows.Window
+                    integer window of the image where data is written, with the same height and width as
+                    data, if None data must cover the full image (default : None)
+
+            Usage:
+            ------
+            ```python
+            writer.write(patch, Window(col_off=512, row_off=256, width=256, height=256))
+            ```
+        '''
+        if self.closed:
+            raise Exception('Error: writer of {} has been closed'.format(self.path))
+
+        if data.ndim == 2:
+            data = data[..., np.newaxis]
+        if data.shape[2] != self.shape[2]:
+            raise Exception('Error: data must have {} bands, got {}'.format(self.shape[2], data.shape[2]))
+
+        if window is None:
+            window = Window(0, 0, self.shape[1], self.shape[0])
+        row_off, col_off = int(round(window.row_off)), int(round(window.col_off))
+        if data.shape[:2] != (int(round(window.height)), int(round(window.width))):
+            raise Exception('Error: data shape {} does not match the window {}'.format(data.shape[:2], window))
+
+        # Keep only the part inside the image
+        r0, c0 = max(row_off, 0), max(col_off, 0)
+        r1, c1 = min(row_off + data.shape[0], self.shape[0]), min(col_off + data.shape[1], self.shape[1])
+        if r0 >= r1 or c0 >= c1:
+            return
+        data = data[r0 - row_off:r1 - row_off, c0 - col_off:c1 - col_off]
+
+        with self._lock:
+            self._dst.write(np.moveaxis(data.astype(self.dtype, copy=False), -1, 0), window=Window(c0, r0, c1 - c0, r1 - r0))
+
+    def close(self) -> None:
+        '''
+            Flush the pending blocks and close the file
+        '''
+        with self._lock:
+            self._dst.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return '<RasterWriter {} shape={} dtype={}>'.format(self.path, self.shape, self.dtype)
@@ -1,12 +1,18 @@
 from ..utils.paths import get_path_gui
+from .._lazy import lazy_import
+from .netcdf_reader import load_netcdf
+from .chunk_store import ChunkStore
+from .raster import Raster
 
-import matplotlib.pyplot as plt
+from affine import Affine
 import numpy as np
-import rasterio
-import netCDF4
 
+plt     = lazy_import('matplotlib.pyplot')
+netCDF4 = lazy_import('netCDF4')
 
-def load(path : str) -> [np.ndarray or dict, dict, list]:
+
+def load(path : str, lazy : bool = False, bands : list = None, resolution : float or tuple = None, variables : list = None,
+         out : np.ndarray = None, dtype : str = None) -> [np.ndarray or dict, dict, list]:
     '''
         Load an image and its metadata given its path.
 
@@ -15,20 +21,59 @@ def load(path : str) -> [np.ndarray or dict, dict, list]:
         RASTERIO_EXTENSIONS   = ['.tif', '.tiff', '.geotiff']  
         MATPLOTLIB_EXTENSIONS = ['.png', '.jpg', 'jpeg', 'jp2']
         NETCDF4_EXTENSIONS    = ['.nc']
+        NUMPY_EXTENSIONS      = ['.npy', '.npz']
+        CHUNKED_EXTENSIONS    = ['.osv']
 
         Returns always data in channel last format.
 
-        If image extension is in MATPLOTLIB_EXTENSIONS, metadata and bouns will be None.
-        If image extension is in NETCDF4_EXTENSIONS, metadata and bounds will be None.
+        If image extension is in MATPLOTLIB_EXTENSIONS, metadata and bouns will be None, unless lazy, bands,
+        resolution, out or dtype are given: the image is then decoded by GDAL (rasterio) exactly as the
+        RASTERIO_EXTENSIONS ones, keeping its native dtype (e.g. uint8/uint16 instead of the floats of
+        matplotlib) with the file metadata and bounds. JPEG and JP2 decoders expose reduced resolution
+        levels (1/2, 1/4, 1/8), so a coarser resolution is decoded directly at that level instead of
+        decoding the full image; PNG is decoded line by line. Images without georeferencing have a pixel
+        size of 1, so resolution is then the decimation factor (e.g. resolution=4). JP2 images are always
+        decoded by GDAL.
+        If image extension is in NETCDF4_EXTENSIONS, metadata and bounds will be None; data is the open
+        netCDF4.Dataset, or, if variables is given, a channel-last TxHxWxV array of the selected variables
+        (see pyosv.io.netcdf_reader for time/space slicing and streaming over time).
+        If image extension is in NUMPY_EXTENSIONS, metadata and bounds will be None.
+
+        If lazy is True and image extension is in RASTERIO_EXTENSIONS, data is a pyosv.io.raster.Raster:
+        only the header is read, pixels are read when the raster is sliced (e.g. data[0:256, 0:256, :]).
+        If lazy is True and image extension is .npy, data is a read-only memory map of the file
+        (.npz archives are always opened lazily, members are decompressed on access).
+        If image extension is in CHUNKED_EXTENSIONS, data is always a lazy pyosv.io.chunk_store.ChunkStore
+        and metadata and bounds are the ones saved with the store; only the chunks intersecting a slice
+        are read (and decompressed).
+
+        If bands or resolution are given (RASTERIO_EXTENSIONS and MATPLOTLIB_EXTENSIONS only), only the selected bands are read, at the
+        target resolution, using the internal overviews of the file (or a decimated read if there are none);
+        metadata is updated to describe the returned data.
+
+        For RASTERIO_EXTENSIONS, data is read directly into a C-contiguous channel-last buffer: out, if
+        given (e.g. to reuse one allocation in a loop), or a new buffer of the given dtype.
         
         Parameters:
         -----------
             - path : str
                 position of the image, if None the function will ask for the image path using a menu
+            - lazy : bool
+                if True, return a lazy Raster handle (or a memory map for .npy) instead of reading all the pixels (default : False)
+            - bands : list
+                list of 0-based band indices to be read, if None all the bands are read (default : None)
+            - resolution : float or tuple
+                target pixel size (x, y) in CRS units, if None the native resolution is used (default : None)
+            - variables : list
+                names of the NetCDF variables to be read into a channel-last array (default : None)
+            - out : np.ndarray
+                preallocated C-contiguous WxHxB buffer to read into, RASTERIO_EXTENSIONS and MATPLOTLIB_EXTENSIONS only (default : None)
+            - dtype : str
+                output dtype when out is None, RASTERIO_EXTENSIONS and MATPLOTLIB_EXTENSIONS only (default : None, the file dtype)
 
         Returns:
         --------
-            - data : np.ndarray or list
+            - data : np.ndarray or list or Raster or ChunkStore
                 WxHxB image, with W width, H height and B bands
 
             - metadata : dict
@@ -46,6 +91,25 @@ def load(path : str) -> [np.ndarray or dict, dict, list]:
         ```python
             img = load("path/to/image.png")
         ``` 
+        or
+        ```python
+            raster, metadata, bounds = load("path/to/image.tif", lazy=True)
+            patch = raster[0:256, 0:256, :]
+        ``` 
+        or
+        ```python
+            buffer = np.empty((1040, 1043, 16), dtype=np.float32)
+            img, metadata, bounds = load("path/to/image.tif", out=buffer)
+        ``` 
+        or
+        ```python
+            rgb, metadata, bounds = load("path/to/image.tif", bands=[3, 2, 1], resolution=160)
+        ``` 
+        or
+        ```python
+            # uint16 JP2 decoded at 1/4 of its resolution
+            preview, metadata, bounds = load("path/to/image.jp2", resolution=40)
+        ``` 
 
         Output:
         -------
@@ -81,29 +145,61 @@ def load(path : str) -> [np.ndarray or dict, dict, list]:
     MATPLOTLIB_EXTENSIONS = ['.png', '.jpg', 'jpeg', 'jp2']
     NETCDF4_EXTENSIONS    = ['.nc']
     NUMPY_EXTENSIONS      = ['.npy', '.npz']
+    CHUNKED_EXTENSIONS    = ['.osv']
     
     
     if path is None:
         path = get_path_gui()
-    
-    if any(frmt in path for frmt in RASTERIO_EXTENSIONS):
-        with rasterio.open(path) as src:
-            data = src.read()
-            metadata = src.profile
-            bounds = src.bounds
-        data = np.moveaxis(data, 0, -1)
+
+    # Images of MATPLOTLIB_EXTENSIONS are decoded by GDAL when any of the rasterio options is used,
+    # JP2 always (matplotlib can not decode multi-band or 16 bit JP2)
+    GDAL_EXTENSIONS = RASTERIO_EXTENSIONS + ['jp2']
+    if lazy or bands is not None or resolution is not None or out is not None or dtype is not None:
+        GDAL_EXTENSIONS = RASTERIO_EXTENSIONS + MATPLOTLIB_EXTENSIONS
+
+    if lazy and not any(frmt in path for frmt in GDAL_EXTENSIONS + NUMPY_EXTENSIONS + CHUNKED_EXTENSIONS):
+        raise Exception('Error: lazy loading is supported only for {} files!'.format(GDAL_EXTENSIONS + NUMPY_EXTENSIONS + CHUNKED_EXTENSIONS))
+
+    if (bands is not None or resolution is not None) and not any(frmt in path for frmt in GDAL_EXTENSIONS):
+        raise Exception('Error: bands and resolution are supported only for {} files!'.format(GDAL_EXTENSIONS))
+
+    if (out is not None or dtype is not None) and not any(frmt in path for frmt in GDAL_EXTENSIONS):
+        raise Exception('Error: out and dtype are supported only for {} files!'.format(GDAL_EXTENSIONS))
+
+    if any(frmt in path for frmt in GDAL_EXTENSIONS):
+        if lazy:
+            data = Raster(path)
+            metadata = data.profile
+            bounds = data.bounds
+        else:
+            with Raster(path) as src:
+                data = src.read(bands=bands, resolution=resolution, out=out, dtype=dtype)
+                metadata = src.profile
+                bounds = src.bounds
+            if bands is not None or resolution is not None:
+                metadata = _read_profile(metadata, data.shape)
+            if data.dtype != np.dtype(metadata['dtype']):
+                metadata = metadata.copy()
+                metadata['dtype'] = data.dtype.name
     elif any(frmt in path for frmt in MATPLOTLIB_EXTENSIONS):
         data = plt.imread(path)
         metadata = None
         bounds = None
     elif any(frmt in path for frmt in NETCDF4_EXTENSIONS):
-        data = netCDF4.Dataset(path, 'r')
+        if variables is not None:
+            data = load_netcdf(path, variables)
+        else:
+            data = netCDF4.Dataset(path, 'r')
         metadata = None
         bounds = None
     elif any(frmt in path for frmt in NUMPY_EXTENSIONS):
-        data = np.load(path)
+        data = np.load(path, mmap_mode='r' if lazy else None)
         metadata = None
         bounds = None
+    elif any(frmt in path for frmt in CHUNKED_EXTENSIONS):
+        data = ChunkStore(path)
+        metadata = data.profile
+        bounds = data.bounds
     else:
         data = None
         metadata = None
@@ -111,3 +207,15 @@ def load(path : str) -> [np.ndarray or dict, dict, list]:
         raise Exception('Error: file can not be opened or format not supported!')
         
     return data, metadata, bounds
+
+
+def _read_profile(profile : dict, shape : tuple) -> dict:
+    '''
+        Update a rasterio profile to describe a HxWxB read of the full extent of the raster
+    '''
+    profile = profile.copy()
+    profile.update({'transform': profile['transform'] * Affine.scale(profile['width'] / shape[1], profile['height'] / shape[0]),
+                    'width': shape[1],
+                    'height': shape[0],
+                    'count': shape[2]})
+    return profile
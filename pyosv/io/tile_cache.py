@@ -0,0 +1,235 @@
+from rasterio.windows import Window
+from collections import OrderedDict
+import numpy as np
+import threading
+import os
+
+
+class TileCache:
+    '''
+        Thread-safe LRU cache of raster blocks with a byte budget.
+
+        Entries are single-band blocks keyed by (file identity, band, block row, block column), where the
+        file identity is (real path, mtime, size), so a file rewritten on disk is never served stale.
+        A cache with max_bytes = 0 is disabled.
+
+        Parameters:
+        -----------
+            - max_bytes : int
+                byte budget of the cache, least recently used blocks are evicted above it
+
+        Attributes:
+        -----------
+            - hits : int
+                number of blocks served from the cache
+            - misses : int
+                number of blocks read from disk
+            - evictions : int
+                number of blocks evicted to respect the byte budget
+
+        Usage:
+        ------
+        ```python
+        cache = set_tile_cache(512 * 2**20)
+
+        for patch in pyosv.io.batch_reader.load('path/to/image.tif', patch_shape=(64, 64)):
+            ...
+
+        print(cache.info())
+        ```
+
+        Output:
+        -------
+        ```
+        {'hits': 1536, 'misses': 512, 'evictions': 0, 'entries': 512, 'bytes': 33554432, 'max_bytes': 536870912}
+        ```
+    '''
+
+    def __init__(self, max_bytes : int = 0) -> None:
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        '''
+            True if the byte budget is grather than 0
+        '''
+        return self.max_bytes > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key : tuple) -> np.ndarray:
+        '''
+            Return the cached block for key (marking it as recently used), None if it is not cached
+        '''
+        with self._lock:
+            block = self._entries.get(key)
+            if block is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return block
+
+    def put(self, key : tuple, block : np.ndarray) -> None:
+        '''
+            Cache a block (read-only), evicting the least recently used blocks above the byte budget
+        '''
+        if block.nbytes > self.max_bytes:
+            return
+
+        block.setflags(write=False)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key).nbytes
+            self._entries[key] = block
+            self._bytes += block.nbytes
+
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def resize(self, max_bytes : int) -> None:
+        '''
+            Change the byte budget, evicting blocks if needed (0 disables the cache)
+        '''
+        with self._lock:
+            self.max_bytes = int(max_bytes)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self) -> None:
+        '''
+            Remove all the blocks and reset the counters
+        '''
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self) -> dict:
+        '''
+            Counters and current size of the cache
+        '''
+        with self._lock:
+            return {'hits' : self.hits, 'misses' : self.misses, 'evictions' : self.evictions,
+                    'entries' : len(self._entries), 'bytes' : self._bytes, 'max_bytes' : self.max_bytes}
+
+
+_TILE_CACHE = TileCache(0)
+
+
+def get_tile_cache() -> TileCache:
+    '''
+        Return the tile cache shared by pyosv readers
+
+        Returns:
+        --------
+            - cache : TileCache
+                the shared tile cache (disabled, max_bytes = 0, by default)
+
+        Usage:
+        ------
+        ```python
+        print(get_tile_cache().info())
+        ```
+    '''
+    return _TILE_CACHE
+
+
+def set_tile_cache(max_bytes : int) -> TileCache:
+    '''
+        Set the byte budget of the tile cache shared by pyosv.io.reader.load, pyosv.io.batch_reader.load
+        and the windowed reads of pyosv.io.raster.Raster
+
+        Parameters:
+        -----------
+            - max_bytes : int
+                byte budget of the cache, 0 disables it
+
+        Returns:
+        --------
+            - cache : TileCache
+                the shared tile cache
+
+        Usage:
+        ------
+        ```python
+        set_tile_cache(1024 * 2**20)
+        ```
+    '''
+    _TILE_CACHE.resize(max_bytes)
+    return _TILE_CACHE
+
+
+def read_cached(src, out : np.ndarray, indexes : list, window : Window = None, cache : TileCache = None) -> bool:
+    '''
+        Fill the HxWxB buffer out with a native-resolution window of src, block by block, serving blocks
+        from the cache when possible. Returns False, without reading, if the read can not be cached
+        (cache disabled, read larger than the budget, non-integer window, unknown file identity, bands
+        with different block shapes or an out dtype different from the file dtype, whose conversion
+        is left to GDAL).
+    '''
+    if cache is None:
+        cache = _TILE_CACHE
+    if not cache.enabled or out.nbytes > cache.max_bytes:
+        return False
+
+    if window is None:
+        window = Window(0, 0, src.width, src.height)
+    if any(v != int(v) for v in (window.col_off, window.row_off, window.width, window.height)):
+        return False
+    col_off, row_off, width, height = int(window.col_off), int(window.row_off), int(window.width), int(window.height)
+    if col_off < 0 or row_off < 0 or col_off + width > src.width or row_off + height > src.height:
+        return False
+    if out.shape[:2] != (height, width) or height == 0 or width == 0:
+        return False
+
+    # GDAL rounds and clips when converting, a numpy copy would truncate and wrap
+    if any(np.dtype(src.dtypes[i - 1]) != out.dtype for i in indexes):
+        return False
+
+    block_shapes = set(src.block_shapes[i - 1] for i in indexes)
+    if len(block_shapes) != 1:
+        return False
+    block_rows, block_cols = block_shapes.pop()
+
+    try:
+        stat = os.stat(src.name)
+    except (OSError, TypeError):
+        return False
+    identity = (os.path.realpath(src.name), stat.st_mtime_ns, stat.st_size)
+
+    for bi in range(row_off // block_rows, (row_off + height - 1) // block_rows + 1):
+        for bj in range(col_off // block_cols, (col_off + width - 1) // block_cols + 1):
+            block_window = Window(bj * block_cols, bi * block_rows,
+                                  min(block_cols, src.width - bj * block_cols),
+                                  min(block_rows, src.height - bi * block_rows))
+
+            blocks = {b : cache.get((identity, b, bi, bj)) for b in set(indexes)}
+            missing = sorted(b for b in blocks if blocks[b] is None)
+            if len(missing) > 0:
+                data = src.read(indexes=missing, window=block_window)
+                for k, b in enumerate(missing):
+                    blocks[b] = data[k].copy()
+                    cache.put((identity, b, bi, bj), blocks[b])
+
+            r0 = max(row_off, block_window.row_off)
+            r1 = min(row_off + height, block_window.row_off + block_window.height)
+            c0 = max(col_off, block_window.col_off)
+            c1 = min(col_off + width, block_window.col_off + block_window.width)
+
+            for k, b in enumerate(indexes):
+                out[r0 - row_off:r1 - row_off, c0 - col_off:c1 - col_off, k] = \
+                    blocks[b][r0 - block_window.row_off:r1 - block_window.row_off, c0 - block_window.col_off:c1 - block_window.col_off]
+
+    return True
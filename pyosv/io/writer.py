@@ -1,12 +1,20 @@
 from ..utils.paths import get_path_gui
+from .._lazy import lazy_import
+from .netcdf_writer import write_netcdf
+from .chunk_store import ChunkStore, CHUNK_COMPRESSIONS
 
-import matplotlib.pyplot as plt
+from rasterio.enums import Resampling
+from rasterio.transform import array_bounds
+from rasterio.env import GDALVersion
 import numpy as np
 import rasterio
-import netCDF4
+import os
 
+plt = lazy_import('matplotlib.pyplot')
 
-def write(image : np.ndarray, path : str, meta : dict) -> None:
+
+def write(image : np.ndarray, path : str, meta : dict = None, cog : bool = False, dtype : str = None, scale : float = None,
+          compress : str = 'deflate', blocksize : int = 512, resampling : str = 'average', num_threads : int or str = 'ALL_CPUS') -> None:
     '''
         Save an image and its metadata given a path.
 
@@ -15,11 +23,32 @@ def write(image : np.ndarray, path : str, meta : dict) -> None:
         RASTERIO_EXTENSIONS   = ['.tif', '.tiff', '.geotiff']  
         MATPLOTLIB_EXTENSIONS = ['.png', '.jpg', 'jpeg', 'jp2']
         NETCDF4_EXTENSIONS    = ['.nc']
+        CHUNKED_EXTENSIONS    = ['.osv']
 
         Data must always be in channel last format.
 
         If image extension is in MATPLOTLIB_EXTENSIONS, metadata can be None.
-        If image extension is in NETCDF4_EXTENSIONS, metadata can be None.
+        If image extension is in NETCDF4_EXTENSIONS, metadata can be None; image can be HxWxV or TxHxWxV
+        and is saved with default chunks and zlib compression (see pyosv.io.netcdf_writer.write_netcdf for
+        variable names, time coordinate, chunk shapes and appending along time).
+        If image extension is in CHUNKED_EXTENSIONS, the image is saved as a pyosv.io.chunk_store.ChunkStore
+        directory (replacing an existing store) of blocksize x blocksize chunks, each compressed on its own
+        (compress is one of CHUNK_COMPRESSIONS, 'deflate' for zlib, or None) by num_threads threads;
+        metadata, with the width, height, count and dtype of the image, and its bounds are saved in the
+        JSON sidecar.
+
+        For RASTERIO_EXTENSIONS all the bands are written in one call, in the dtype of the image, or in
+        dtype if given. When downcasting (e.g. float reflectances to uint16) the image is multiplied by
+        scale, rounded and clipped to the range of dtype (NaN become nodata, or 0), and 1 / scale is saved
+        as the band scale, so GDAL-aware readers can restore the original values.
+
+        If cog is True the image is written as a Cloud Optimized GeoTIFF: tiled (blocksize x blocksize),
+        compressed with a predictor (horizontal differencing for integers, floating point for floats) and
+        with internal overviews built with resampling, so both the output and later (windowed, reduced
+        resolution) reads are smaller. Metadata creation options (e.g. compress, tiled) are otherwise kept.
+
+        Compressed GeoTIFF blocks (and overviews) are compressed by num_threads GDAL threads; use
+        num_threads=1 when many images are written concurrently (see pyosv.io.parallel_writer.write_many).
 
         Parameters:
         -----------
@@ -28,7 +57,23 @@ def write(image : np.ndarray, path : str, meta : dict) -> None:
             - path : str 
                 position of the image, if None the function will ask for the image path using a menu
             - meta : dict
-                metadata for the image to be saved
+                metadata for the image to be saved (e.g. the one returned by pyosv.io.reader.load), for
+                RASTERIO_EXTENSIONS width, height, count and dtype are taken from the image (default : None)
+            - cog : bool
+                if True write a Cloud Optimized GeoTIFF, RASTERIO_EXTENSIONS only (default : False)
+            - dtype : str
+                dtype of the saved image, if None the image dtype is kept, RASTERIO_EXTENSIONS only (default : None)
+            - scale : float
+                factor applied to the image before casting it to dtype (default : None)
+            - compress : str
+                compression of the Cloud Optimized GeoTIFF, e.g. 'deflate', 'lzw', 'zstd', or of the chunks of
+                CHUNKED_EXTENSIONS (default : 'deflate')
+            - blocksize : int
+                tile size of the Cloud Optimized GeoTIFF, or chunk size of CHUNKED_EXTENSIONS (default : 512)
+            - resampling : str
+                resampling of the overviews of the Cloud Optimized GeoTIFF (default : 'average')
+            - num_threads : int or str
+                number of threads compressing the blocks (or chunks), or 'ALL_CPUS' (default : 'ALL_CPUS')
         
         Returns:
         --------
@@ -59,6 +104,11 @@ def write(image : np.ndarray, path : str, meta : dict) -> None:
 
         write(img, 'path/to/save/img.png')
         
+        ```
+        or
+        ```python
+        # float reflectances saved as a uint16 COG (values x 10000)
+        write(img, 'path/to/save/img.tif', meta, cog=True, dtype='uint16', scale=10000)
         ```
         Output:
         -------
@@ -70,26 +120,112 @@ def write(image : np.ndarray, path : str, meta : dict) -> None:
     RASTERIO_EXTENSIONS   = ['.tif', '.tiff']
     MATPLOTLIB_EXTENSIONS = ['.png', '.jpg', 'jpeg', 'jp2']
     NETCDF4_EXTENSIONS    = ['.nc']
+    CHUNKED_EXTENSIONS    = ['.osv']
 
 
     if path is None:
         path = get_path_gui()
 
-    if any(frmt in path for frmt in RASTERIO_EXTENSIONS):
-        if image!=None:
-            meta.update({'driver':'GTiff',
-                            'width':image.shape[0],
-                            'height':image.shape[1],
-                            'count':image.shape[2],
-                            'dtype':'float64'})
+    if (cog or dtype is not None or scale is not None) and not any(frmt in path for frmt in RASTERIO_EXTENSIONS):
+        raise Exception('Error: cog, dtype and scale are supported only for {} files!'.format(RASTERIO_EXTENSIONS))
 
-        with rasterio.open(fp=path, mode='w',**meta) as dst:
-            for count in range(image.shape[2]):
-                dst.write(image[:,:,count], count)
+    if any(frmt in path for frmt in RASTERIO_EXTENSIONS):
+        if image.ndim == 2:
+            image = image[..., np.newaxis]
+
+        meta = dict(meta) if meta is not None else {}
+        dtype = np.dtype(dtype) if dtype is not None else image.dtype
+        nodata = meta.get('nodata')
+        if nodata is not None and np.isnan(nodata) and np.issubdtype(dtype, np.integer):
+            nodata = 0
+        image = _to_dtype(image, dtype, scale, nodata)
+
+        meta.update({'driver'   : 'GTiff',
+                     'width'    : image.shape[1],
+                     'height'   : image.shape[0],
+                     'count'    : image.shape[2],
+                     'dtype'    : dtype.name,
+                     'nodata'   : nodata})
+        if num_threads is not None:
+            meta['NUM_THREADS'] = str(num_threads)
+
+        if cog:
+            for key in ['tiled', 'blockxsize', 'blockysize', 'compress', 'predictor', 'interleave', 'photometric']:
+                meta.pop(key, None)
+            meta.update({'compress'  : compress,
+                         'predictor' : 2 if np.issubdtype(dtype, np.integer) else 3,
+                         'BIGTIFF'   : 'IF_SAFER'})
+            if GDALVersion.runtime().at_least('3.1'):
+                meta.update({'driver' : 'COG', 'blocksize' : blocksize, 'overview_resampling' : resampling})
+            else:
+                meta.update({'tiled' : True, 'blockxsize' : blocksize, 'blockysize' : blocksize, 'interleave' : 'pixel'})
+
+        with rasterio.open(fp=path, mode='w', **meta) as dst:
+            # All the bands in one call, from a band-first view of the channel-last image
+            dst.write(np.moveaxis(image, -1, 0))
+            if scale is not None:
+                dst.scales = [1 / scale] * image.shape[2]
+            if cog and meta['driver'] == 'GTiff':
+                factors = _overview_factors(image.shape[:2], blocksize)
+                if len(factors) > 0:
+                    dst.build_overviews(factors, Resampling[resampling])
 
     elif any(frmt in path for frmt in MATPLOTLIB_EXTENSIONS):
         plt.imsave(path, image)
     elif any(frmt in path for frmt in NETCDF4_EXTENSIONS):
-        raise Exception('Error: [under dev] currently netCDF4 files can not be saved!')
+        write_netcdf(path, image, meta=meta)
+    elif any(frmt in path for frmt in CHUNKED_EXTENSIONS):
+        if image.ndim == 2:
+            image = image[..., np.newaxis]
+
+        bounds = None
+        if meta is not None and meta.get('transform') is not None:
+            bounds = array_bounds(image.shape[0], image.shape[1], meta['transform'])
+            bounds = (bounds[0], bounds[1], bounds[2], bounds[3])
+
+        compression = None if compress is None else compress.lower()
+        compression = 'zlib' if compression == 'deflate' else compression
+        if compression is not None and compression not in CHUNK_COMPRESSIONS:
+            raise Exception("Error: compress must be one of {}, 'deflate' or None for {} files".format(CHUNK_COMPRESSIONS, CHUNKED_EXTENSIONS))
+
+        meta = dict(meta) if meta is not None else {}
+        meta.update({'width'  : image.shape[1],
+                     'height' : image.shape[0],
+                     'count'  : image.shape[2],
+                     'dtype'  : image.dtype.name})
+        workers = os.cpu_count() if num_threads in (None, 'ALL_CPUS') else int(num_threads)
+        ChunkStore.from_array(path, image, chunks=(blocksize, blocksize), profile=meta, bounds=bounds,
+                              compression=compression, overwrite=True, max_workers=workers)
     else:
         raise Exception('Error: file can not be saved, format not supported!')
+
+
+def _to_dtype(image : np.ndarray, dtype : np.dtype, scale : float = None, nodata : float = None) -> np.ndarray:
+    '''
+        Multiply image by scale and cast it to dtype, rounding and clipping to the range of integer dtypes
+    '''
+    if scale is not None:
+        image = image * np.asarray(scale, dtype=image.dtype if image.dtype.kind == 'f' else np.float64)
+    if image.dtype == dtype:
+        return image
+    if not np.issubdtype(dtype, np.integer) or np.issubdtype(image.dtype, np.integer) and np.can_cast(image.dtype, dtype):
+        return image.astype(dtype)
+
+    info = np.iinfo(dtype)
+    invalid = ~np.isfinite(image) if image.dtype.kind == 'f' else None
+    with np.errstate(invalid='ignore'):
+        out = np.clip(np.rint(image) if image.dtype.kind == 'f' else image, info.min, info.max).astype(dtype)
+    if invalid is not None and invalid.any():
+        out[invalid] = nodata if nodata is not None else 0
+    return out
+
+
+def _overview_factors(shape : tuple, blocksize : int) -> list:
+    '''
+        Decimation factors 2, 4, 8, ... until the overview fits in one block
+    '''
+    factors, factor = [], 2
+    while max(shape) / (factor // 2) > blocksize:
+        factors.append(factor)
+        factor *= 2
+    return factors
@@ -0,0 +1,15 @@
+'''
+    pyosv routines related to bounded-memory, window by window, processing chains
+'''
+
+from .._lazy import attach
+
+__getattr__, __dir__, __all__ = attach(__name__,
+    submodules = ['engine', 'stage'],
+    names      = {
+        'Pipeline'                    : '.engine',
+        'Stage'                       : '.stage',
+        'minmax_stage'                : '.stage',
+        'normalized_difference_stage' : '.stage',
+        'select_stage'                : '.stage',
+    })
\ No newline at end of file
@@ -0,0 +1,246 @@
+from ..io.raster_writer import RasterWriter
+from ..io.batch_reader import _ThreadHandles
+from ..io.raster import _read_into
+from ..io.writer import _to_dtype
+from .stage import Stage
+
+from concurrent.futures import ThreadPoolExecutor
+from rasterio.dtypes import in_dtype_range
+from rasterio.windows import Window
+from collections import deque
+import numpy as np
+import threading
+import rasterio
+import time
+
+
+class Pipeline:
+    '''
+        Processing chain executed window by window, from a source raster to a destination GeoTIFF, in
+        bounded memory.
+
+        Stages are declared once and applied in order to each window of the source image, read directly
+        in the work dtype (float32 by default, stage outputs are cast back to it, so no float64 temporaries
+        survive a stage). Windows are processed by a pool of worker threads (numpy and rasterio release the
+        GIL) and written, in order, to a tiled destination as soon as they are ready.
+
+        The window size is derived from max_memory: the chain is first run on a small sample to measure
+        the bytes per pixel of its largest stage, then windows (full-width strips, or tiles for very wide
+        images, aligned to the destination blocks) are sized so that the 2 x workers windows being read,
+        processed or waiting to be written fit in max_memory.
+
+        Parameters:
+        -----------
+            - stages : list
+                list of Stage (plain callables are wrapped in a Stage)
+            - max_memory : int
+                memory ceiling in bytes of the windows in flight (default : 256 * 2**20)
+            - workers : int
+                number of worker threads (default : 4)
+            - dtype : str
+                work dtype of the stages (default : 'float32')
+
+        Attributes:
+        -----------
+            - timings : dict
+                seconds spent reading, in each stage and writing during the last run (summed over the workers)
+
+        Usage:
+        ------
+        ```python
+        pipeline = Pipeline([
+            normalized_difference_stage(7, 3),
+            minmax_stage(-1, 1, clip=[0, 1]),
+        ], max_memory=512 * 2**20, workers=8)
+
+        pipeline.run('path/to/S2.tif', 'path/to/ndvi.tif', compress='deflate')
+        ```
+
+        Output:
+        -------
+        ```
+        {'read': 12.4, 'normalized_difference': 1.9, 'minmax_scaler': 1.1, 'write': 6.3}
+        ```
+    '''
+
+    def __init__(self, stages : list, max_memory : int = 256 * 2**20, workers : int = 4, dtype : str = 'float32') -> None:
+        if workers < 1:
+            raise Exception('Error: workers must be grather than 0')
+        if max_memory <= 0:
+            raise Exception('Error: max_memory must be grather than 0')
+
+        self.stages = [s if isinstance(s, Stage) else Stage(s) for s in stages]
+        self.max_memory = int(max_memory)
+        self.workers = workers
+        self.dtype = np.dtype(dtype)
+        self.halo = sum(s.halo for s in self.stages)
+        self.timings = {}
+
+        # Timing keys, stages with the same name are numbered
+        self._names = []
+        for s in self.stages:
+            name, k = s.name, 1
+            while name in self._names or name in ('read', 'write'):
+                name, k = '{}_{}'.format(s.name, k), k + 1
+            self._names.append(name)
+
+    def __call__(self, img : np.ndarray) -> np.ndarray:
+        '''
+            Apply the stages to an in-memory HxWxB image (no windowing)
+        '''
+        img = np.asarray(img).astype(self.dtype, copy=False)
+        for s in self.stages:
+            img = s(img).astype(self.dtype, copy=False)
+        return img
+
+    def run(self, src_path : str, dst_path : str, dtype : str = None, block_shape : tuple = (256, 256), **profile) -> dict:
+        '''
+            Process a raster window by window and write the result to a tiled GeoTIFF
+
+            Parameters:
+            -----------
+                - src_path : str
+                    position of the source raster
+                - dst_path : str
+                    position of the destination GeoTIFF
+                - dtype : str
+                    dtype of the destination, values are rounded and clipped to the range of integer dtypes, if None
+                    the work dtype is used (default : None)
+                - block_shape : tuple[int,int]
+                    (rows, cols) internal tile shape of the destination, multiples of 16 (default : (256, 256))
+                - profile : dict
+                    further creation options of the destination (e.g. compress='deflate', nodata=-1); nodata
+                    defaults to the nodata of the source, pixels that are nodata in all the source bands are
+                    set to it in the destination
+
+            Returns:
+            --------
+                - timings : dict
+                    seconds spent reading, in each stage and writing (summed over the workers)
+
+            Usage:
+            ------
+            ```python
+            timings = pipeline.run('path/to/S2.tif', 'path/to/ndvi.tif', dtype='float32', compress='deflate', predictor=3)
+            ```
+        '''
+
+        if len(self.stages) == 0:
+            raise Exception('Error: the pipeline has no stages')
+
+        timings = {name : 0.0 for name in ['read'] + self._names + ['write']}
+        lock = threading.Lock()
+        handles = _ThreadHandles(src_path)
+
+        def process(window):
+            src = handles.get()
+
+            # Read the window plus the halo needed by the stages, clipped to the image
+            r0, c0 = max(0, window.row_off - self.halo), max(0, window.col_off - self.halo)
+            r1 = min(src.height, window.row_off + window.height + self.halo)
+            c1 = min(src.width, window.col_off + window.width + self.halo)
+
+            t = time.perf_counter()
+            img = np.empty((r1 - r0, c1 - c0, src.count), dtype=self.dtype)
+            _read_into(src, img, list(range(1, src.count + 1)), Window(c0, r0, c1 - c0, r1 - r0))
+            elapsed = [time.perf_counter() - t]
+
+            invalid = None
+            if src_nodata is not None and nodata is not None:
+                invalid = np.isnan(img).all(axis=-1) if np.isnan(src_nodata) else (img == src_nodata).all(axis=-1)
+
+            for s in self.stages:
+                t = time.perf_counter()
+                img = s(img).astype(self.dtype, copy=False)
+                elapsed.append(time.perf_counter() - t)
+
+            with lock:
+                for name, seconds in zip(['read'] + self._names, elapsed):
+                    timings[name] += seconds
+
+            crop = (slice(window.row_off - r0, window.row_off - r0 + window.height), slice(window.col_off - c0, window.col_off - c0 + window.width))
+            # Rounded and clipped to the range of integer dtypes, as pyosv.io.writer.write does
+            img = _to_dtype(img[crop], out_dtype, nodata=nodata)
+            if invalid is not None:
+                img[invalid[crop]] = nodata
+            return img
+
+        with rasterio.open(src_path) as src:
+            bands, bytes_per_pixel = self._probe(src)
+            out_dtype = np.dtype(dtype) if dtype is not None else self.dtype
+
+            src_nodata = src.nodata
+            nodata = profile.get('nodata', src_nodata)
+            if nodata is not None and (out_dtype.kind != 'f' if np.isnan(nodata) else not in_dtype_range(nodata, out_dtype.name)):
+                raise Exception('Error: nodata {} is out of the range of {}, give a nodata for the destination'.format(nodata, out_dtype.name))
+
+            dst_profile = src.profile.copy()
+            for key in ['nodata', 'photometric', 'blockxsize', 'blockysize', 'compress', 'predictor', 'interleave']:
+                dst_profile.pop(key, None)
+            dst_profile.update(count=bands, dtype=out_dtype.name, interleave='pixel', nodata=nodata)
+            dst_profile.update(profile)
+
+            # Each window in flight holds its input and the largest stage input/output (with halo)
+            budget = self.max_memory // (2 * self.workers)
+            windows = _windows(src.height, src.width, block_shape, budget, bytes_per_pixel, self.halo)
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        queue = deque()
+        try:
+            with RasterWriter(dst_path, dst_profile, block_shape=block_shape) as dst:
+
+                def write(future, window):
+                    data = future.result()
+                    t = time.perf_counter()
+                    dst.write(data, window)
+                    timings['write'] += time.perf_counter() - t
+
+                for window in windows:
+                    queue.append((executor.submit(process, window), window))
+                    if len(queue) >= 2 * self.workers:
+                        write(*queue.popleft())
+                while len(queue) > 0:
+                    write(*queue.popleft())
+        finally:
+            for future, _ in queue:
+                future.cancel()
+            executor.shutdown(wait=True)
+            handles.close()
+
+        self.timings = timings
+        return timings
+
+    def _probe(self, src : rasterio.io.DatasetReader) -> tuple:
+        '''
+            Run the stages on a small sample of src: number of output bands and peak bytes per pixel
+        '''
+        size = min(8, src.height), min(8, src.width)
+        img = np.empty(size + (src.count,), dtype=self.dtype)
+        _read_into(src, img, list(range(1, src.count + 1)), Window(0, 0, size[1], size[0]))
+
+        peak = img.shape[-1]
+        for s in self.stages:
+            out = s(img).astype(self.dtype, copy=False)
+            peak = max(peak, img.shape[-1] + out.shape[-1])
+            img = out
+
+        return img.shape[-1], peak * self.dtype.itemsize
+
+
+def _windows(height : int, width : int, block_shape : tuple, budget : int, bytes_per_pixel : int, halo : int = 0) -> list:
+    '''
+        Block-aligned windows covering the image, each fitting (with its halo) in budget bytes: full-width
+        strips of whole block rows when possible, else tiles of one block row
+    '''
+    block_rows, block_cols = block_shape
+    pixels = max(1, budget // bytes_per_pixel)
+
+    rows = (pixels // (width + 2 * halo) - 2 * halo) // block_rows * block_rows
+    if rows >= block_rows:
+        cols = width
+    else:
+        rows = block_rows
+        cols = max(block_cols, (pixels // (rows + 2 * halo) - 2 * halo) // block_cols * block_cols)
+
+    return [Window(j, i, min(cols, width - j), min(rows, height - i))
+            for i in range(0, height, rows) for j in range(0, width, cols)]
@@ -0,0 +1,160 @@
+from ..pre.normalizer import minmax_scaler
+
+import numpy as np
+
+
+class Stage:
+    '''
+        Step of a pyosv.pipeline.Pipeline: a function applied independently to every window of the image.
+
+        The function receives a HxWxB array in the work dtype of the pipeline (float32 by default) and
+        must return a HxWxB' or HxW array of the same height and width. Statistics computed inside the
+        function (e.g. a minimum when mmin is None) are per window, global statistics must be given as
+        arguments. Stages needing neighbouring pixels (e.g. filters) declare it with halo: windows are
+        then read with halo extra pixels on each side and cropped after the last stage.
+
+        Parameters:
+        -----------
+            - func : callable
+                function applied to each window, called as func(img, **kwargs)
+            - name : str
+                name of the stage in the pipeline timings, if None the function name is used (default : None)
+            - bands : list
+                0-based bands of the stage input passed to func, if None all the bands are passed (default : None)
+            - halo : int
+                number of context pixels needed on each side of a window (default : 0)
+            - kwargs : dict
+                further arguments passed to func
+
+        Usage:
+        ------
+        ```python
+        stage = Stage(np.clip, name='clip', a_min=0, a_max=10000)
+        ```
+    '''
+
+    def __init__(self, func, name : str = None, bands : list = None, halo : int = 0, **kwargs) -> None:
+        if halo < 0:
+            raise Exception('Error: halo must be grather than or equal to 0')
+
+        self.func = func
+        self.name = name if name is not None else getattr(func, '__name__', type(func).__name__)
+        self.bands = list(bands) if bands is not None else None
+        self.halo = int(halo)
+        self.kwargs = kwargs
+
+    def __call__(self, img : np.ndarray) -> np.ndarray:
+        if self.bands is not None:
+            img = img[..., self.bands]
+
+        out = np.asarray(self.func(img, **self.kwargs))
+        if out.ndim == 2:
+            out = out[..., np.newaxis]
+        if out.ndim != 3 or out.shape[:2] != img.shape[:2]:
+            raise Exception('Error: stage {} must return a HxW or HxWxB array of the same height and width, got {}'.format(self.name, out.shape))
+        return out
+
+    def __repr__(self) -> str:
+        return 'Stage({}, bands={}, halo={})'.format(self.name, self.bands, self.halo)
+
+
+def minmax_stage(mmin : float, mmax : float, clip : list = [None, None], bands : list = None) -> Stage:
+    '''
+        Stage applying pyosv.pre.normalizer.minmax_scaler with global minimum and maximum
+
+        Parameters:
+        -----------
+            - mmin : float
+                minimum of the whole image (per-window statistics would differ from window to window)
+            - mmax : float
+                maximum of the whole image
+            - clip : list
+                a list of two values used to constrain the image values (default : [None, None])
+            - bands : list
+                0-based bands to be scaled, the other bands are passed through unchanged, if None all the
+                bands are scaled (default : None)
+
+        Returns:
+        --------
+            - stage : Stage
+                the min max scaler stage
+
+        Usage:
+        ------
+        ```python
+        stage = minmax_stage(0, 10000, clip=[0, 1])
+        ```
+    '''
+    if mmin is None or mmax is None:
+        raise Exception('Error: mmin and mmax must be given, a pipeline stage sees one window at a time')
+    if bands is None:
+        return Stage(minmax_scaler, mmin=mmin, mmax=mmax, clip=clip)
+    return Stage(_minmax_bands, name='minmax_scaler', bands_to_scale=list(bands), mmin=mmin, mmax=mmax, clip=clip)
+
+
+def normalized_difference_stage(band_1 : int, band_2 : int) -> Stage:
+    '''
+        Stage computing pyosv.post.normalized_difference.normalized_difference between two bands, 0
+        where both bands are 0 (e.g. nodata areas)
+
+        Parameters:
+        -----------
+            - band_1 : int
+                0-based index of channelA
+            - band_2 : int
+                0-based index of channelB
+
+        Returns:
+        --------
+            - stage : Stage
+                stage returning a single-band HxWx1 normalized difference
+
+        Usage:
+        ------
+        ```python
+        # NDVI of a 13 bands Sentinel-2 image (B8 and B4)
+        stage = normalized_difference_stage(7, 3)
+        ```
+    '''
+    return Stage(_normalized_difference, name='normalized_difference', bands=[band_1, band_2])
+
+
+def select_stage(bands : list) -> Stage:
+    '''
+        Stage keeping only some bands
+
+        Parameters:
+        -----------
+            - bands : list
+                0-based bands to be kept, in order
+
+        Returns:
+        --------
+            - stage : Stage
+                the band selection stage
+
+        Usage:
+        ------
+        ```python
+        stage = select_stage([3, 2, 1])
+        ```
+    '''
+    return Stage(_identity, name='select', bands=bands)
+
+
+def _minmax_bands(img : np.ndarray, bands_to_scale : list, **kwargs) -> np.ndarray:
+    out = img.copy()
+    out[..., bands_to_scale] = minmax_scaler(img[..., bands_to_scale], **kwargs)
+    return out
+
+
+def _normalized_difference(img : np.ndarray) -> np.ndarray:
+    # As pyosv.post.normalized_difference.normalized_difference, without leaving the pixels with a
+    # zero denominator uninitialized
+    num = img[..., 0] - img[..., 1]
+    den = img[..., 0] + img[..., 1]
+    return np.divide(num, den, out=np.zeros_like(num), where=den != 0)
+
+
+def _identity(img : np.ndarray) -> np.ndarray:
+    return img
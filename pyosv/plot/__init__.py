@@ -2,5 +2,19 @@
     pyosv routines related to image plotting
 '''
 
-from .geo import *
-from .plot import *
\ No newline at end of file
+from .._lazy import attach
+
+# plot is both a submodule and a function: bind the function eagerly, as the submodule
+# attribute set by the import system would otherwise shadow the lazy lookup
+from .plot import plot
+
+# The cube plots need mayavi: as before they are not exported, use pyosv.plot.cube.cube_plot
+__getattr__, __dir__, __all__ = attach(__name__,
+    submodules = ['cube', 'geo', 'plot'],
+    names      = {
+        'geo_plot'          : '.geo',
+        'plot'              : '.plot',
+        'bands_plot'        : '.plot',
+    })
+
+__all__ = [name for name in __all__ if name != 'cube']
\ No newline at end of file
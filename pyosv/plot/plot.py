@@ -1,6 +1,9 @@
-import matplotlib.pyplot as plt
+from .._lazy import lazy_import
+
 import numpy as np
 
+plt = lazy_import('matplotlib.pyplot')
+
 def plot(img : np.ndarray, hist : bool = False) -> None:
     '''
         Plot a satellite image and its histogram.
@@ -2,6 +2,17 @@
     pyosv routines related to image post-processing
 '''
 
-from .patch_extractor import *
-from .normalized_difference import *
-from .composite import *
\ No newline at end of file
+from .._lazy import attach
+
+# normalized_difference is both a submodule and a function: bind the function eagerly, as the
+# submodule attribute set by the import system would otherwise shadow the lazy lookup
+from .normalized_difference import normalized_difference
+
+__getattr__, __dir__, __all__ = attach(__name__,
+    submodules = ['patch_extractor', 'normalized_difference', 'composite'],
+    names      = {
+        'get_patches'           : '.patch_extractor',
+        'reverse_get_patches'   : '.patch_extractor',
+        'normalized_difference' : '.normalized_difference',
+        'S1_RGB'                : '.composite',
+    })
\ No newline at end of file
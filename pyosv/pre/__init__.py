@@ -2,7 +2,14 @@
     pyosv routines related to image pre-processing
 '''
 
-from .hist_normalizer import *
-from ..post.normalized_difference import *
-from .normalizer_bands import *
-from .normalizer import *
\ No newline at end of file
+from .._lazy import attach
+
+__getattr__, __dir__, __all__ = attach(__name__,
+    submodules = ['hist_normalizer', 'normalizer_bands', 'normalizer'],
+    names      = {
+        'hist_normalizer'       : '.hist_normalizer',
+        'normalized_difference' : '..post.normalized_difference',
+        'percentile_prescaler'  : '.normalizer',
+        'minmax_scaler'         : '.normalizer',
+        'std_scaler'            : '.normalizer',
+    })
\ No newline at end of file
@@ -2,6 +2,13 @@
     pyosv routines related to image utils
 '''
 
-from .mapper import *
-from .paths import *
-from .printer import *
\ No newline at end of file
+from .._lazy import attach
+
+__getattr__, __dir__, __all__ = attach(__name__,
+    submodules = ['mapper', 'paths', 'printer'],
+    names      = {
+        'mapFromTo'    : '.mapper',
+        'get_path_gui' : '.paths',
+        'dict_disp'    : '.printer',
+        'print_stats'  : '.printer',
+    })
\ No newline at end of file
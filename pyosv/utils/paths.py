@@ -1,5 +1,7 @@
-from tkinter.filedialog import askopenfilename
-from tkinter import Tk
+from .._lazy import lazy_import
+
+tkinter    = lazy_import('tkinter')
+filedialog = lazy_import('tkinter.filedialog')
 
 
 def get_path_gui() -> str:
@@ -30,9 +32,9 @@ def get_path_gui() -> str:
 
     '''
     
-    root = Tk()
+    root = tkinter.Tk()
     root.withdraw()
-    path = askopenfilename(
+    path = filedialog.askopenfilename(
         title='Select the file or the folder!',
         initialdir='/'
         )
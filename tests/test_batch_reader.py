@@ -0,0 +1,71 @@
+'''
+    pyosv.io.batch_reader patch grid, padding and valid-pixel filtering
+'''
+
+from rasterio.transform import from_origin
+import numpy as np
+import rasterio
+import pytest
+
+from pyosv.io import batch_reader
+from pyosv.io.batch_reader import _offsets
+
+
+@pytest.mark.parametrize('size, patch, stride, padding, expected', [
+    (10, 4, 4, None, [0, 4]),
+    (10, 4, 4, 'constant', [0, 4, 8]),
+    (10, 4, 2, None, [0, 2, 4, 6]),
+    (10, 4, 3, 'reflect', [0, 3, 6]),
+    (3, 4, 4, None, []),
+    (3, 4, 4, 'constant', [0]),
+    (300, 10, 100, None, [0, 100, 200]),
+    (300, 10, 100, 'constant', [0, 100, 200]),
+    (250, 10, 100, 'reflect', [0, 100, 200]),
+])
+def test_offsets(size, patch, stride, padding, expected):
+    assert _offsets(size, patch, stride, padding) == expected
+
+
+@pytest.fixture(scope='module')
+def image(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('batch') / 'image.tif')
+    data = np.random.default_rng(0).integers(1, 255, size=(2, 300, 250), dtype=np.uint8)
+    data[:, :100, :100] = 0
+    with rasterio.open(path, 'w', driver='GTiff', width=250, height=300, count=2, dtype='uint8', nodata=0,
+                       transform=from_origin(0, 300, 1, 1)) as dst:
+        dst.write(data)
+    return path, np.moveaxis(data, 0, -1)
+
+
+@pytest.mark.parametrize('padding', [None, 'constant', 'reflect', 'edge'])
+def test_patches_start_inside_the_image(image, padding):
+    path, data = image
+    for patch, window, _ in batch_reader.load(path, (10, 10), stride=(100, 100), padding=padding, return_window=True):
+        assert window.row_off < data.shape[0] and window.col_off < data.shape[1]
+        assert np.array_equal(patch, data[window.row_off:window.row_off + 10, window.col_off:window.col_off + 10])
+
+
+def test_padded_patches(image):
+    path, data = image
+    patches = list(batch_reader.load(path, (64, 64), padding='reflect', return_window=True))
+    assert len(patches) == 5 * 4
+
+    patch, window, _ = patches[-1]
+    inside = data[window.row_off:, window.col_off:]
+    expected = np.pad(inside, ((0, 64 - inside.shape[0]), (0, 64 - inside.shape[1]), (0, 0)), mode='reflect')
+    assert np.array_equal(patch, expected)
+
+
+@pytest.mark.parametrize('reader', ['load', 'load_batches', 'load_prefetch'])
+def test_min_valid(image, reader):
+    path, data = image
+    expected = [(i, j) for i in range(0, 300 - 49, 50) for j in range(0, 250 - 49, 50)
+                if (data[i:i + 50, j:j + 50] != 0).any(axis=-1).mean() >= 0.5]
+
+    if reader == 'load_batches':
+        windows = [w for _, batch_windows, _ in batch_reader.load_batches(path, (50, 50), batch_size=4, min_valid=0.5, return_window=True)
+                   for w in batch_windows]
+    else:
+        windows = [w for _, w, _ in getattr(batch_reader, reader)(path, (50, 50), min_valid=0.5, return_window=True)]
+
+    assert [(w.row_off, w.col_off) for w in windows] == expected
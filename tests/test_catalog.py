@@ -0,0 +1,45 @@
+'''
+    pyosv.io.catalog.Catalog scans and acquisition dates
+'''
+
+from rasterio.transform import from_origin
+import numpy as np
+import rasterio
+import os
+
+from pyosv.io.catalog import Catalog
+
+
+def _write(path : str, **tags) -> None:
+    with rasterio.open(path, 'w', driver='GTiff', width=4, height=4, count=1, dtype='uint8', crs='EPSG:32633',
+                       transform=from_origin(500000, 5000000, 10, 10)) as dst:
+        dst.write(np.zeros((1, 4, 4), dtype=np.uint8))
+        dst.update_tags(**tags)
+
+
+def test_acquisition_dates(tmp_path):
+    root = tmp_path / 'rasters'
+    root.mkdir()
+    # TIFFTAG_DATETIME is the processing time, the file name wins
+    _write(str(root / 'S2_20190621_T32TQM.tif'), TIFFTAG_DATETIME='2024:01:01 10:00:00')
+    _write(str(root / 'scene.tif'), ACQUISITION_DATE='2018-03-04')
+    _write(str(root / 'undated.tif'), TIFFTAG_DATETIME='2024:01:01 10:00:00')
+
+    with Catalog(str(tmp_path / 'catalog.db')) as catalog:
+        counts = catalog.scan(str(root))
+        dates = {os.path.basename(r['path']) : r['date'] for r in catalog.query()}
+
+    assert counts['added'] == 3 and counts['failed'] == 0
+    assert dates == {'S2_20190621_T32TQM.tif' : '2019-06-21', 'scene.tif' : '2018-03-04', 'undated.tif' : None}
+
+
+def test_scan_survives_unreadable_files(tmp_path):
+    root = tmp_path / 'rasters'
+    root.mkdir()
+    _write(str(root / 'good_20200101.tif'))
+    (root / 'broken.tif').write_bytes(b'not a tiff')
+
+    with Catalog(str(tmp_path / 'catalog.db')) as catalog:
+        counts = catalog.scan(str(root))
+        assert counts['added'] == 1 and counts['failed'] == 1
+        assert len(catalog.query(start='2020-01-01', end='2020-01-01')) == 1
@@ -0,0 +1,64 @@
+'''
+    pyosv.io.chunk_store.ChunkStore round trips, selections and layout checks
+'''
+
+import numpy as np
+import pytest
+
+from pyosv.io.chunk_store import ChunkStore
+
+
+@pytest.fixture(scope='module')
+def data():
+    return np.random.default_rng(0).integers(0, 1000, size=(130, 90, 5), dtype=np.uint16)
+
+
+@pytest.mark.parametrize('chunks, compression, shuffle', [
+    ((32, 32), None, True),
+    ((32, 25, 2), None, True),
+    ((32, 25, 2), 'zlib', True),
+    ((64, 40, 1), 'lzma', False),
+    ((50, 50, 3), 'bz2', True),
+])
+def test_round_trip(tmp_path, data, chunks, compression, shuffle):
+    path = str(tmp_path / 'cube.osv')
+    ChunkStore.from_array(path, data, chunks=chunks, compression=compression, shuffle=shuffle, max_workers=2)
+
+    store = ChunkStore(path)
+    assert store.shape == data.shape
+    assert np.array_equal(store[:, :, :], data)
+    assert np.array_equal(store[10:100, 7:61, [4, 0, 2]], data[10:100, 7:61][:, :, [4, 0, 2]])
+    assert np.array_equal(store[::7, ::-3, 1:4], data[::7, ::-3, 1:4])
+    assert np.array_equal(store[129, 5, 3], data[129, 5, 3])
+
+    for _, _, window, chunk in store.iter_chunks():
+        assert np.array_equal(chunk, data[window.row_off:window.row_off + window.height,
+                                          window.col_off:window.col_off + window.width])
+
+
+def test_missing_chunks_read_as_fill_value(tmp_path):
+    store = ChunkStore.create(str(tmp_path / 'cube.osv'), (40, 40, 2), 'int16', chunks=(16, 16, 1),
+                              compression='zlib', profile={'nodata' : -1})
+    store.write_chunk(0, 0, np.ones((16, 16, 1), dtype=np.int16), 1)
+
+    out = store[:, :, :]
+    assert np.all(out[:16, :16, 1] == 1)
+    assert np.all(out[:16, :16, 0] == -1)
+    assert np.all(out[16:] == -1)
+
+
+def test_create_refuses_a_different_layout(tmp_path, data):
+    path = str(tmp_path / 'cube.osv')
+    ChunkStore.from_array(path, data, chunks=(32, 32))
+
+    with pytest.raises(Exception):
+        ChunkStore.create(path, (64, 4, 4), 'uint16')
+    with pytest.raises(Exception):
+        ChunkStore.from_array(path, data, chunks=(32, 32), compression='zlib')
+
+    # Same layout: the chunks are kept
+    store = ChunkStore.create(path, data.shape, data.dtype, chunks=(32, 32), profile={'nodata' : 0})
+    assert np.array_equal(store[:, :, :], data)
+
+    store = ChunkStore.from_array(path, data[:10], overwrite=True)
+    assert np.array_equal(store[:, :, :], data[:10])
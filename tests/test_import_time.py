@@ -0,0 +1,52 @@
+'''
+    Import-time budget of pyosv: importing the package must stay cheap, heavy third-party
+    libraries are imported only when a routine needing them is used
+'''
+
+import subprocess
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time of pyosv (numpy included), in seconds
+IMPORT_TIME_BUDGET = 1.0
+
+HEAVY_MODULES = ['rasterio', 'matplotlib', 'netCDF4', 'tkinter', 'mayavi']
+
+
+def _run(code : str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    return subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def test_import_time_budget():
+    result = _run('import pyosv')
+
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    cumulative = None
+    for line in result.stderr.splitlines():
+        fields = [f.strip() for f in line.split('|')]
+        if len(fields) == 3 and fields[2] == 'pyosv':
+            cumulative = int(fields[1]) / 1e6
+
+    assert cumulative is not None, 'pyosv not found in the -X importtime output'
+    assert cumulative < IMPORT_TIME_BUDGET, 'import pyosv took {:.3f} s, budget is {} s'.format(cumulative, IMPORT_TIME_BUDGET)
+
+
+def test_heavy_modules_not_imported():
+    result = _run('import sys, pyosv; print(",".join(m for m in {} if m in sys.modules))'.format(HEAVY_MODULES))
+    assert result.stdout.strip() == '', 'import pyosv imported {}'.format(result.stdout.strip())
+
+
+def test_public_names():
+    result = _run('import pyosv; print(pyosv.plot.__module__, pyosv.load.__module__, pyosv.io.__name__)')
+    assert result.stdout.split() == ['pyosv.plot.plot', 'pyosv.io.reader', 'pyosv.io']
+
+
+def test_star_imports():
+    # Optional dependencies of routines that are not exported (e.g. mayavi for pyosv.plot.cube) must
+    # not be needed by star imports
+    result = _run('from pyosv import *; from pyosv.plot import *; print(callable(plot), callable(geo_plot))')
+    assert result.stdout.split() == ['True', 'True']
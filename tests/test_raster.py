@@ -0,0 +1,61 @@
+'''
+    pyosv.io.raster.Raster slicing against the NumPy reference
+'''
+
+from rasterio.transform import from_origin
+import numpy as np
+import rasterio
+import pytest
+
+from pyosv.io.raster import Raster
+
+
+@pytest.fixture(scope='module')
+def image(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('raster') / 'image.tif')
+    data = np.random.default_rng(0).integers(0, 10000, size=(4, 150, 110), dtype=np.uint16)
+    with rasterio.open(path, 'w', driver='GTiff', width=110, height=150, count=4, dtype='uint16', tiled=True,
+                       blockxsize=32, blockysize=32, transform=from_origin(0, 1500, 10, 10), crs='EPSG:32633') as dst:
+        dst.write(data)
+    return path, np.moveaxis(data, 0, -1)
+
+
+KEYS = [
+    (slice(None), slice(None), slice(None)),
+    (slice(10, 50), slice(5, 77), [3, 2, 1]),
+    (slice(None, None, 16), slice(None, None, 16), 0),
+    (slice(None, None, -1), slice(None), slice(1, 3)),
+    (slice(140, 3, -7), slice(100, None, -9), [0]),
+    (slice(7, 149, 33), slice(3, 109, 50), slice(None, None, 2)),
+    (5, slice(None, None, -5), slice(None)),
+    (slice(10, 12), 3, 2),
+    (slice(5, 5), slice(None), 0),
+]
+
+
+@pytest.mark.parametrize('key', KEYS)
+def test_getitem_matches_numpy(image, key):
+    path, data = image
+    with Raster(path) as raster:
+        out = raster[key]
+    expected = data[key]
+    assert out.shape == expected.shape
+    assert np.array_equal(out, expected)
+
+
+def test_strided_rows_read_only_selected_rows(image, monkeypatch):
+    path, data = image
+    windows = []
+    read = Raster.read
+
+    def spy(self, window=None, **kwargs):
+        windows.append(window)
+        return read(self, window=window, **kwargs)
+
+    monkeypatch.setattr(Raster, 'read', spy)
+    with Raster(path) as raster:
+        out = raster[::16, ::16, 0]
+
+    assert np.array_equal(out, data[::16, ::16, 0])
+    assert len(windows) == len(range(0, 150, 16))
+    assert all(int(w.height) == 1 for w in windows)
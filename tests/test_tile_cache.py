@@ -0,0 +1,46 @@
+'''
+    pyosv.io.tile_cache reads must return the same pixels as direct reads
+'''
+
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+import numpy as np
+import rasterio
+import pytest
+
+from pyosv.io.tile_cache import TileCache, read_cached
+
+
+@pytest.fixture(scope='module')
+def image(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('cache') / 'image.tif')
+    data = np.random.default_rng(0).uniform(-50, 400, size=(3, 100, 90)).astype(np.float32)
+    with rasterio.open(path, 'w', driver='GTiff', width=90, height=100, count=3, dtype='float32', tiled=True,
+                       blockxsize=16, blockysize=16, transform=from_origin(0, 100, 1, 1)) as dst:
+        dst.write(data)
+    return path
+
+
+@pytest.mark.parametrize('window', [None, Window(0, 0, 16, 16), Window(5, 7, 50, 33), Window(70, 90, 20, 10)])
+def test_cached_read_matches_direct_read(image, window):
+    cache = TileCache(2**24)
+    with rasterio.open(image) as src:
+        expected = np.moveaxis(src.read([3, 1], window=window), 0, -1)
+        shape = expected.shape
+
+        for _ in range(2):
+            out = np.empty(shape, dtype=np.float32)
+            assert read_cached(src, out, [3, 1], window, cache)
+            assert np.array_equal(out, expected)
+
+
+def test_dtype_conversion_is_left_to_gdal(image):
+    cache = TileCache(2**24)
+    with rasterio.open(image) as src:
+        out = np.empty((100, 90, 1), dtype=np.uint8)
+        assert not read_cached(src, out, [1], None, cache)
+
+
+def test_disabled_cache(image):
+    with rasterio.open(image) as src:
+        assert not read_cached(src, np.empty((100, 90, 1), dtype=np.float32), [1], None, TileCache(0))